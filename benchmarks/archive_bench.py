@@ -0,0 +1,58 @@
+"""Benchmark of reading a single day back out of the archive and JSON outputs.
+
+usage: python -m benchmarks.archive_bench [--lines N] [--days N]
+
+A synthetic energymech corpus is converted to both formats, then the time to
+fetch one day from the middle of each is measured, along with the file sizes.
+JSON has to be parsed whole to get at any day, the archive only decodes the
+day's block."""
+
+import argparse
+
+import json
+
+import os
+
+import tempfile
+
+import timeit
+
+from benchmarks import corpus
+
+from converters import energymech
+
+from utilities.archive import ArchiveReader, ArchiveWriter
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--lines", type=int, default=500000, help="Lines in the generated corpus.")
+  parser.add_argument("--days", type=int, default=365, help="Days the corpus is spread over.")
+  arguments = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    corpus.write_energymech(os.path.join(directory, "logs"), arguments.lines, arguments.days)
+    logs = energymech.convert(os.path.join(directory, "logs"))
+    (json_path, archive_path) = (os.path.join(directory, "logs.json"), os.path.join(directory, "logs.archive"))
+    with open(json_path, 'w', encoding='utf-8') as json_file:
+      json.dump(dict((str(date), lines) for (date, lines) in logs.items()), json_file)
+    archive = ArchiveWriter(archive_path)
+    for date in sorted(logs):
+      archive.write_day(date, logs[date])
+    archive.close()
+
+    date = sorted(logs)[len(logs) // 2]
+    with ArchiveReader(archive_path) as reader:
+      assert reader.day(date) == logs[date]
+
+      def read_json():
+        with open(json_path, 'r', encoding='utf-8') as json_file:
+          return json.load(json_file)[str(date)]
+      for (name, path, function) in (("json", json_path, read_json),
+                                     ("archive", archive_path, lambda: reader.day(date))):
+        elapsed = min(timeit.repeat(function, number=1, repeat=5))
+        print("{:<10}{:>10.2f} ms/day{:>10.1f} MB".format(name, elapsed * 1000, os.path.getsize(path) / 1e6))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,94 @@
+"""Validate and benchmark ToyKeeperConverter.calculate_offset against the
+strptime/gmtime round trip it replaced.
+
+usage: python -m benchmarks.calculate_offset_bench [--lines N]
+
+Results are compared in several timezones, over DST changes and around day
+rollovers, for a range of UTC offsets, before the two are timed."""
+
+import argparse
+
+import os
+
+import time
+
+from calendar import timegm
+
+from converters.toykeeper import ToyKeeperConverter
+
+from utilities.time2seconds import time2seconds
+
+
+def strptime_calculate_offset(date, time_, offset):
+  """The previous calculate_offset, kept as the reference for speed and results."""
+  timestamp = int(time.mktime(time.strptime(date, "%Y-%m-%d"))) + time2seconds(time_)
+  if offset == None:
+    return (time2seconds(time_), int(time.mktime(time.strptime(date, "%Y-%m-%d"))))
+  offset_timestamp = timestamp - ((int(offset)) * (60 ** 2))
+  offset_gmtime = time.gmtime(offset_timestamp)
+  time_ = time2seconds(time.strftime("%H:%M:%S", offset_gmtime))
+  date = offset_gmtime[:3] + (0,0,0) + offset_gmtime[6:9]
+  return (time_, timegm(date))
+
+
+timezones = ("UTC", "America/New_York", "Europe/London", "Australia/Lord_Howe", "Asia/Kolkata")
+
+# Dates either side of DST changes in the timezones above, and of year and month ends.
+dates = ("2013-12-31", "2014-01-01", "2014-02-28", "2014-03-01", "2014-03-09", "2014-03-10",
+         "2014-03-30", "2014-03-31", "2014-04-06", "2014-10-05", "2014-10-26", "2014-11-02",
+         "2016-02-29", "1970-01-01", "2038-01-19")
+
+times = ("00:00:00", "00:00:01", "00:59:59", "01:00:00", "01:30:00", "01:59:59", "02:00:00",
+         "02:30:00", "03:00:00", "11:59:59", "12:00:00", "22:59:59", "23:00:00", "23:59:59")
+
+offsets = (None, 0, 1, -1, 5, -5, 12, -12, 14, "3", "-9")
+
+
+def check():
+  """Compare every date, time and offset combination in every timezone."""
+  original_timezone = os.environ.get("TZ")
+  checked = 0
+  try:
+    for timezone in timezones:
+      os.environ["TZ"] = timezone
+      time.tzset()
+      ToyKeeperConverter.date_midnights.clear()
+      for date in dates:
+        for time_ in times:
+          for offset in offsets:
+            expected = strptime_calculate_offset(date, time_, offset)
+            result = ToyKeeperConverter.calculate_offset(date, time_, offset)
+            assert result == expected, (timezone, date, time_, offset, result, expected)
+            checked += 1
+  finally:
+    if original_timezone is None:
+      del os.environ["TZ"]
+    else:
+      os.environ["TZ"] = original_timezone
+    time.tzset()
+    ToyKeeperConverter.date_midnights.clear()
+  return checked
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--lines", type=int, default=200000, help="Number of lines to time.")
+  arguments = parser.parse_args()
+
+  print("{} combinations agree".format(check()))
+  lines = [("2014-03-%02d" % (1 + line * 30 // arguments.lines), "%02d:%02d:%02d" % (line % 24, line % 60, line % 59))
+           for line in range(arguments.lines)]
+  for offset in (None, 5):
+    elapsed = {}
+    for (name, function) in (("strptime", strptime_calculate_offset), ("cached", ToyKeeperConverter.calculate_offset)):
+      start = time.perf_counter()
+      for (date, time_) in lines:
+        function(date, time_, offset)
+      elapsed[name] = time.perf_counter() - start
+    print("offset {!s:<5} strptime {:>8.0f} ns/line  cached {:>6.0f} ns/line  {:.1f}x".format(
+          offset, elapsed["strptime"] / len(lines) * 1e9, elapsed["cached"] / len(lines) * 1e9,
+          elapsed["strptime"] / elapsed["cached"]))
+
+
+if __name__ == "__main__":
+  main()
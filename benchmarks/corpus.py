@@ -0,0 +1,140 @@
+"""Deterministic generator of synthetic energymech and ToyKeeper logs.
+
+usage: python -m benchmarks.corpus {energymech,toykeeper} PATH [--lines N] [--days N] [--seed N]
+                                   [--mix TYPE=WEIGHT ...]
+
+The same arguments always produce byte-identical logs, so benchmark results
+from different runs and different revisions can be compared."""
+
+import argparse
+
+import calendar
+
+import os
+
+import random
+
+import time
+
+# Relative weights of each line type, roughly those of a busy channel.
+default_mix = {"PRIVMSG":80, "ACTION":3, "NOTICE":1, "JOIN":5, "PART":3, "QUIT":4,
+               "KICK":1, "NICK":1, "MODE":1, "TOPIC":1}
+
+words = ("the a an log logs irc channel python bot energymech line lines of text with some "
+         "words and then it is was not but what when why how please thanks ok yes no "
+         "server client network nick mode topic kick join part quit hello everyone").split()
+
+# Formats of each line type after the timestamp, filled in by the generator.
+# ToyKeeper logs have no quit or nick change lines the converter recognises, so
+# those types are left out of its mix rather than generated as unparsed lines.
+energymech_templates = {"PRIVMSG":"<{nick}> {text}",
+                        "ACTION":"* {nick} {text}",
+                        "NOTICE":"-{nick}- {text}",
+                        "JOIN":"*** Joins: {nick} (~{user}@{host})",
+                        "PART":"*** Parts: {nick} (~{user}@{host}) ({text})",
+                        "QUIT":"*** Quits: {nick} (~{user}@{host}) (Quit: {text})",
+                        "KICK":"*** {nick} was kicked by {other} ({text})",
+                        "NICK":"*** {nick} is now known as {other}",
+                        "MODE":"*** {other} sets mode: +o {nick}",
+                        "TOPIC":"*** {other} changes topic to '{text}'"}
+
+toykeeper_templates = {"PRIVMSG":"<{nick}>\t{text}",
+                       "ACTION":"[{nick}]\tACTION {text}",
+                       "NOTICE":"-{nick}-\t{text}",
+                       "JOIN":"--\t{nick} (~{user}@{host}) joined #channel",
+                       "PART":"--\t{nick} (~{user}@{host}) left #channel",
+                       "KICK":"--\t{nick} kicked off by {other} (~{other}@{host}) {text}",
+                       "MODE":"--\t{other} changed mode: +o {nick}",
+                       "TOPIC":"--\t{other} changed topic: {text}"}
+
+first_day = calendar.timegm((2014, 1, 1, 0, 0, 0))
+
+
+class LineGenerator():
+  """Produce the text of log lines, after their timestamp, from a seeded random source.
+  Types of the mix without a template are not generated."""
+
+  def __init__(self, templates, mix=None, seed=0, nicks=500):
+    self.random = random.Random(seed)
+    mix = mix or default_mix
+    self.types = [line_type for line_type in mix if mix[line_type] > 0 and line_type in templates]
+    self.weights = [mix[line_type] for line_type in self.types]
+    self.templates = templates
+    self.nicks = ["%s%d" % (self.random.choice(words), number) for number in range(nicks)]
+    self.hosts = ["host%d.%s.example.net" % (number, self.random.choice(words)) for number in range(nicks // 2 + 1)]
+
+  def line(self):
+    """Return (line_type, text) for the next line."""
+    choice = self.random
+    line_type = choice.choices(self.types, self.weights)[0]
+    nick = choice.choice(self.nicks)
+    text = " ".join(choice.choices(words, k=int(choice.expovariate(1 / 9)) + 1))
+    return (line_type, self.templates[line_type].format(nick=nick, other=choice.choice(self.nicks),
+                                                        user=nick[:9], host=choice.choice(self.hosts),
+                                                        text=text))
+
+
+def day_seconds(lines_per_day):
+  """Return the time of day of each of lines_per_day lines, spread through the day."""
+  return [line * 86400 // lines_per_day for line in range(lines_per_day)]
+
+
+def write_energymech(directory, lines, days=30, mix=None, seed=0):
+  """Write lines lines split evenly over days energymech day files in directory.
+  Returns the list of paths written."""
+  generator = LineGenerator(energymech_templates, mix, seed)
+  os.makedirs(directory, exist_ok=True)
+  paths = []
+  for day in range(days):
+    date = time.strftime("%Y%m%d", time.gmtime(first_day + day * 86400))
+    path = os.path.join(directory, "irc.example.net_#channel_" + date + ".log")
+    with open(path, 'w', encoding='latin-1') as log:
+      for second in day_seconds(lines // days):
+        log.write("[%02d:%02d:%02d] %s\n" % (second // 3600, second // 60 % 60, second % 60,
+                                              generator.line()[1]))
+    paths.append(path)
+  return paths
+
+
+def write_toykeeper(filepath, lines, days=30, mix=None, seed=0):
+  """Write lines lines spread evenly over days days to a single ToyKeeper log file.
+  Returns the list of paths written."""
+  generator = LineGenerator(toykeeper_templates, mix, seed)
+  with open(filepath, 'w', encoding='latin-1') as log:
+    for day in range(days):
+      date = time.strftime("%Y-%m-%d", time.gmtime(first_day + day * 86400))
+      for second in day_seconds(lines // days):
+        log.write("%s %02d:%02d:%02d %s\n" % (date, second // 3600, second // 60 % 60, second % 60,
+                                               generator.line()[1]))
+  return [filepath]
+
+
+writers = {"energymech":write_energymech, "toykeeper":write_toykeeper}
+
+
+def parse_mix(pairs):
+  """Turn TYPE=WEIGHT strings into a mix, starting from the default weights."""
+  mix = dict(default_mix)
+  for pair in pairs or ():
+    (line_type, weight) = pair.split("=")
+    if line_type.upper() not in default_mix:
+      raise ValueError("Unknown line type " + line_type + " in mix.")
+    mix[line_type.upper()] = float(weight)
+  return mix
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("format", choices=sorted(writers), help="The log format to generate.")
+  parser.add_argument("path", help="Directory (energymech) or file (toykeeper) to write.")
+  parser.add_argument("--lines", type=int, default=1000000, help="Total number of lines.")
+  parser.add_argument("--days", type=int, default=30, help="Number of days to spread them over.")
+  parser.add_argument("--seed", type=int, default=0, help="Seed of the random source.")
+  parser.add_argument("--mix", nargs="*", help="Line type weights as TYPE=WEIGHT, e.g. PRIVMSG=90 KICK=0.")
+  arguments = parser.parse_args()
+  writers[arguments.format](arguments.path, arguments.lines, arguments.days,
+                            parse_mix(arguments.mix), arguments.seed)
+
+
+if __name__ == "__main__":
+  main()
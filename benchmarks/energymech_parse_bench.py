@@ -0,0 +1,103 @@
+"""Benchmark the table-driven energymech parser against the if/elif chain it replaced.
+
+usage: python -m benchmarks.energymech_parse_bench [--lines N] [--files N]
+
+A synthetic corpus is written to a temporary directory, parsed by both
+implementations, and their output checked to be identical before timing.
+Records are counted rather than kept so the timings are of parsing alone."""
+
+import argparse
+
+import itertools
+
+import os
+
+import tempfile
+
+import time
+
+from benchmarks import corpus
+
+from converters.energymech import energymech_converter
+
+from utilities.time2seconds import time2seconds
+
+
+def chain_parse(filepath, total_lines):
+  """The previous energymech_parse, kept as the reference for speed and results."""
+  with open(filepath, 'r', encoding="latin-1") as log:
+    lines_in_file = 0
+    for line in log:
+      type_parse = line.split(" ", 2)
+      space_parse = line.split(" ")
+      timestamp = time2seconds(type_parse[0][1:-1])
+      line_id = total_lines + lines_in_file
+      if type_parse[1] != "***" and type_parse[1][0] == "<":
+        yield [line_id, "PRIVMSG", timestamp, type_parse[1][1:-1], type_parse[2][:-1]]
+      elif type_parse[1] == "*":
+        me_elements = line.split(" ", 3)
+        yield [line_id, "PRIVMSG", timestamp, me_elements[2], "/me " + me_elements[3][:-1]]
+      elif ''.join((type_parse[1][0], type_parse[1][-1])) == "--":
+        yield [line_id, "NOTICE", timestamp, type_parse[1][1:-1], type_parse[2][:-1]]
+      elif space_parse[2] == "Joins:":
+        yield [line_id, "JOIN", timestamp, space_parse[3], space_parse[4][1:-2]]
+      elif space_parse[2] == "Parts:":
+        part_elements = line.split(" ", 5)[3:]
+        yield [line_id, "PART", timestamp, part_elements[0], part_elements[1][1:-1], part_elements[2][1:-2]]
+      elif space_parse[2] == "Quits:":
+        quit_elements = line.split(" ", 5)[3:]
+        yield [line_id, "QUIT", timestamp, quit_elements[0], quit_elements[1][1:-1], quit_elements[2][1:-2]]
+      elif ''.join(space_parse[3:5]) == "waskicked":
+        yield [line_id, "KICK", timestamp, space_parse[2], space_parse[6], space_parse[7][1:-2]]
+      elif ''.join(space_parse[4:7]) == "nowknownas":
+        yield [line_id, "NICK", timestamp, space_parse[2], space_parse[-1][:-1]]
+      elif ''.join(space_parse[3:5]) == "setsmode:":
+        yield [line_id, "SETMODE", timestamp, line.split(" ", 5)[2], line.split(" ", 5)[5][:-1]]
+      elif ''.join(space_parse[3:5]) == "changestopic":
+        yield [line_id, "TOPIC", timestamp, space_parse[2], line.split(" ", 6)[6][:-1]]
+      lines_in_file += 1
+  return lines_in_file
+
+
+def counted(parse, paths):
+  """Yield the records of every file in paths, numbering lines across files."""
+  total_lines = 0
+  for path in paths:
+    total_lines += yield from parse(path, total_lines)
+
+
+def check(paths):
+  """Make sure both parsers produce identical records, without holding them all."""
+  for (chain_record, table_record) in itertools.zip_longest(counted(chain_parse, paths),
+                                                            counted(energymech_converter.energymech_parse, paths)):
+    assert chain_record == (list(table_record) if table_record else None), "Parsers disagree: {} {}".format(chain_record, table_record)
+
+
+def run(parse, paths):
+  """Parse every file in paths, returning (seconds, lines)."""
+  start = time.perf_counter()
+  lines = 0
+  for record in counted(parse, paths):
+    lines += 1
+  return (time.perf_counter() - start, lines)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--lines", type=int, default=2000000, help="Number of lines in the corpus.")
+  parser.add_argument("--files", type=int, default=20, help="Number of day files to spread them over.")
+  arguments = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    corpus.write_energymech(directory, arguments.lines, arguments.files)
+    paths = sorted(os.path.join(directory, filename) for filename in os.listdir(directory))
+    check(paths)
+    (chain_time, lines) = run(chain_parse, paths)
+    (table_time, lines) = run(energymech_converter.energymech_parse, paths)
+  for (name, elapsed) in (("if/elif chain", chain_time), ("table dispatch", table_time)):
+    print("{:<16}{:>12.0f} lines/sec".format(name, lines / elapsed))
+  print("speedup {:.2f}x".format(chain_time / table_time))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,159 @@
+"""Benchmark harness for the converters and output handlers.
+
+usage: python -m benchmarks.run [--lines N] [--days N] [--seed N] [--converters ...]
+                                [--outputs ...] [--results FILE]
+
+A synthetic corpus is generated for each converter, then every converter and
+output handler pair is run in a fresh process so its peak RSS is its own.
+Lines/sec, MB/sec of input and peak RSS are printed for each pair, and the
+whole run is appended as one JSON object per line to the results file so it
+can be tracked over time. A pair whose process fails is reported with its error
+and the rest still run."""
+
+import argparse
+
+import importlib
+
+import importlib.util
+
+import json
+
+import multiprocessing
+
+import os
+
+import platform
+
+import queue
+
+import resource
+
+import subprocess
+
+import tempfile
+
+import time
+
+from benchmarks import corpus
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Output handler class in the command line script for each output format, None
+# benchmarks conversion to in-memory python datastructures.
+output_handlers = {"none":None,
+                   "json":"BufferedJSONOutputHandler",
+                   "jsonl":"BufferedJSONLinesOutputHandler",
+                   "sqlite":"BufferedSqliteOutputHandler",
+                   "sqlite-bulk":"BufferedSqliteBulkOutputHandler",
+                   "archive":"BufferedArchiveOutputHandler"}
+
+
+def load_script():
+  """Import the command line script, which holds the output handlers, as a module."""
+  spec = importlib.util.spec_from_file_location("energymech_log_converter",
+                                                os.path.join(repository, "energymech-log-converter.py"))
+  script = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(script)
+  return script
+
+
+def run_case(converter_name, output_name, logs, output_path, results):
+  """Convert logs in this process and put the measurements, or the error it
+  failed with, on the results queue."""
+  try:
+    converter = importlib.import_module("converters." + converter_name)
+    if output_handlers[output_name]:
+      output_handler = getattr(load_script(), output_handlers[output_name])(output_path)
+    else:
+      output_handler = None
+    start = time.perf_counter()
+    converter.convert(logs, output_handler)
+    elapsed = time.perf_counter() - start
+  except Exception as error:
+    results.put({"error":"{}: {}".format(type(error).__name__, error)})
+    raise
+  results.put({"seconds":elapsed, "peak_rss_kb":resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               "bytes_out":os.path.getsize(output_path) if output_handler else 0})
+
+
+def measure(converter_name, output_name, logs, paths, lines, directory):
+  """Run a single converter/output pair in a spawned process and return its results,
+  which hold an "error" instead of measurements if the process failed."""
+  context = multiprocessing.get_context("spawn")
+  results = context.Queue()
+  output_path = os.path.join(directory, converter_name + "." + output_name)
+  process = context.Process(target=run_case, args=(converter_name, output_name, logs, output_path, results))
+  process.start()
+  result = None
+  while result is None:
+    try:
+      result = results.get(timeout=1)
+    except queue.Empty:
+      if not process.is_alive():
+        # Anything it put just before exiting may still be on its way.
+        try:
+          result = results.get(timeout=1)
+        except queue.Empty:
+          break
+  process.join()
+  if os.path.exists(output_path):
+    os.remove(output_path)
+  if result is None:
+    result = {"error":"exited with code {} before reporting".format(process.exitcode)}
+  if "error" in result:
+    result.update({"converter":converter_name, "output":output_name})
+    return result
+  bytes_in = sum(os.path.getsize(path) for path in paths)
+  result.update({"converter":converter_name, "output":output_name, "lines":lines, "bytes_in":bytes_in,
+                 "lines_per_sec":lines / result["seconds"],
+                 "mb_per_sec":bytes_in / result["seconds"] / 1e6})
+  return result
+
+
+def revision():
+  """Return the git commit the benchmark was run against, if it can be found."""
+  try:
+    return subprocess.run(["git", "rev-parse", "HEAD"], cwd=repository, capture_output=True,
+                          text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--lines", type=int, default=500000, help="Lines in each generated corpus.")
+  parser.add_argument("--days", type=int, default=30, help="Days the corpus is spread over.")
+  parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator.")
+  parser.add_argument("--mix", nargs="*", help="Line type weights as TYPE=WEIGHT, e.g. PRIVMSG=90 KICK=0.")
+  parser.add_argument("--converters", nargs="*", default=sorted(corpus.writers), help="Converters to benchmark.")
+  parser.add_argument("--outputs", nargs="*", default=list(output_handlers), help="Output formats to benchmark.")
+  parser.add_argument("--results", default="benchmark-results.jsonl", help="File to append the results to.")
+  arguments = parser.parse_args()
+
+  mix = corpus.parse_mix(arguments.mix)
+  run = {"time":time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "commit":revision(),
+         "python":platform.python_version(), "machine":platform.machine(), "processor":platform.processor(),
+         "corpus":{"lines":arguments.lines, "days":arguments.days, "seed":arguments.seed, "mix":mix},
+         "results":[]}
+  print("{:<12}{:<12}{:>14}{:>10}{:>14}".format("converter", "output", "lines/sec", "MB/sec", "peak RSS MB"))
+  with tempfile.TemporaryDirectory() as directory:
+    for converter_name in arguments.converters:
+      logs = os.path.join(directory, converter_name + "-logs")
+      paths = corpus.writers[converter_name](logs, arguments.lines, arguments.days, mix, arguments.seed)
+      lines = arguments.lines // arguments.days * arguments.days
+      for output_name in arguments.outputs:
+        result = measure(converter_name, output_name, logs, paths, lines, directory)
+        run["results"].append(result)
+        if "error" in result:
+          print("{:<12}{:<12}  failed: {}".format(converter_name, output_name, result["error"]))
+          continue
+        print("{:<12}{:<12}{:>14.0f}{:>10.2f}{:>14.1f}".format(converter_name, output_name, result["lines_per_sec"],
+                                                              result["mb_per_sec"], result["peak_rss_kb"] / 1024))
+  with open(arguments.results, 'a', encoding='utf-8') as results_file:
+    results_file.write(json.dumps(run) + "\n")
+  if any("error" in result for result in run["results"]):
+    raise SystemExit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,66 @@
+"""Micro-benchmark of time2seconds against the strptime implementation it replaced.
+
+usage: python -m benchmarks.time2seconds_bench [--lines N]
+
+Times are fed in the order a busy log would produce them, so the memo table
+sees the same repetition it does during a real conversion."""
+
+import argparse
+
+import string
+
+import time
+
+import timeit
+
+from utilities.time2seconds import time2seconds, parse_time
+
+
+def strptime_time2seconds(time_string):
+  """The previous time2seconds, kept as the reference for speed and results."""
+  if len(time_string) != 8 and len(time_string) != 5:
+    raise ValueError("Time given to time2seconds() was not a time_string.")
+  for character in time_string:
+    if character in string.ascii_letters:
+      raise ValueError("Time given to time2seconds() was not a time_string.")
+  if len(time_string) == 8:
+    time_elements = time.strptime(time_string,"%H:%M:%S")
+  else:
+    time_elements = time.strptime(time_string, "%H:%M")
+  return (time_elements.tm_hour * 60 + time_elements.tm_min) * 60 + time_elements.tm_sec
+
+
+def log_times(lines):
+  """Return lines timestamps spread evenly over a day, several lines a second."""
+  return ["%02d:%02d:%02d" % (second // 3600, second // 60 % 60, second % 60)
+          for second in (line * 86400 // lines for line in range(lines))]
+
+
+def check(times):
+  """Make sure every implementation agrees with the reference."""
+  for time_string in set(times):
+    expected = strptime_time2seconds(time_string)
+    assert parse_time(time_string) == expected, time_string
+    assert time2seconds(time_string) == expected, time_string
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--lines", type=int, default=500000, help="Number of timestamps to convert.")
+  arguments = parser.parse_args()
+
+  times = log_times(arguments.lines)
+  check(times)
+  candidates = (("strptime", strptime_time2seconds),
+                ("fixed offset", parse_time),
+                ("fixed offset + memo", time2seconds))
+  baseline = None
+  for (name, function) in candidates:
+    elapsed = min(timeit.repeat(lambda: [function(t) for t in times], number=1, repeat=3))
+    per_line = elapsed / len(times) * 1e9
+    baseline = baseline or per_line
+    print("{:<22}{:>10.1f} ns/line{:>8.1f}x".format(name, per_line, baseline / per_line))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,156 @@
+"""Benchmark the single pass ToyKeeper tokenizer against the classifier it replaced.
+
+usage: python -m benchmarks.toykeeper_parse_bench [--lines N] [--days N]
+
+A synthetic corpus is written to a temporary file and converted by both
+implementations, each reading it with its own toykeeper_fields. The previous
+classifier turned every '--' server line into a NOTICE, so their records are
+only checked to be identical for the lines it got right, and the number it got
+wrong is reported. Records are counted rather than kept so the timings are of
+converting alone."""
+
+import argparse
+
+import itertools
+
+import mmap
+
+import os
+
+import tempfile
+
+import time
+
+from benchmarks import corpus
+
+from converters.toykeeper import ToyKeeperConverter
+
+from sys import intern
+
+
+def chain_fields(filepath):
+  """The previous toykeeper_fields, reading the mapped file a line at a time."""
+  with open(filepath, 'rb') as logfile:
+    with mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ) as log:
+      readline = log.readline
+      while log.tell() < len(log):
+        space_split = readline().split(b" ", 2)
+        tab_split = space_split[2].split(b"\t", 2)
+        yield (space_split[0].decode('latin-1'), space_split[1].decode('latin-1'),
+               tab_split[0].decode('latin-1'), tab_split[1].decode('latin-1'))
+
+
+def chain_linetype(hostmask, contents):
+  """The previous toykeeper_linetype, kept as the reference for speed."""
+  if hostmask[0] + hostmask[-1] == "<>":
+    line_type = "PRIVMSG"
+  elif hostmask[0] + hostmask[-1] == "[]" and contents[0:6] == "ACTION":
+    line_type = "ACTION"
+  elif hostmask[0] + hostmask[-1] == "--":
+    content_split = contents.split(" ")
+    if hostmask == "-dircproxy-":
+      if contents == "You connected\n":
+        line_type = "CONNECTED"
+      elif contents == "You disconnected\n":
+        line_type = "DISCONNECTED"
+    elif contents == "You joined the channel\n":
+      line_type = "JOINED"
+    if len(content_split) < 3:
+      line_type = "NOTICE"
+    elif content_split[2] == "joined":
+      line_type = "JOIN"
+    elif content_split[2] == "left":
+      line_type = "PART"
+    elif content_split[1] + content_split[2] == "kickedoff":
+      line_type = "KICK"
+    elif content_split[0][0] + content_split[0][-1] == "[]":
+      line_type = "NOTICE"
+    try:
+      if (content_split[1] + content_split[2] == "changedmode:" or
+          content_split[2] + content_split[3] == "changedmode:"):
+        line_type = "SETMODE"
+      elif (content_split[1] + content_split[2] == "changedtopic:" or
+            content_split[2] + content_split[3] == "changedtopic:"):
+        line_type = "TOPIC"
+    except IndexError:
+      line_type = "NOTICE"
+    if contents[0:4] == "CTCP":
+      line_type = "CTCP"
+    else:
+      line_type = "NOTICE"
+  return line_type
+
+
+def chain_days(path, line_id, utc_offset):
+  """The previous toykeeper_days and construct, for the line types the previous
+  classifier could return."""
+  def process_line(line_id, date, timestamp, hostmask, contents, offset):
+    line_type = chain_linetype(hostmask, contents)
+    (offset_timestamp, offset_datestamp) = ToyKeeperConverter.calculate_offset(date, timestamp, offset)
+    universal = (line_id, line_type, offset_timestamp)
+    converted_line = universal + (intern(hostmask[1:-1]), contents[:-1])
+    return (converted_line, offset_datestamp)
+
+  (day, current_date, lines) = ([], None, 0)
+  for (date, timestamp, hostmask, contents) in chain_fields(path):
+    (converted_line, offset_datestamp) = process_line(line_id + lines, date, timestamp, hostmask, contents, utc_offset)
+    if current_date is None:
+      current_date = offset_datestamp
+    elif offset_datestamp > current_date:
+      yield (current_date, day)
+      (current_date, day) = (offset_datestamp, [])
+    day.append(converted_line)
+    lines += 1
+  if day:
+    yield (current_date, day)
+
+
+def table_days(path, line_id, utc_offset):
+  fields = ToyKeeperConverter.toykeeper_fields(path)
+  return ToyKeeperConverter.toykeeper_days(ToyKeeperConverter, fields, line_id, utc_offset)
+
+
+def records(days, path):
+  return itertools.chain.from_iterable(lines for (date, lines) in days(path, 0, None))
+
+
+def check(path):
+  """Make sure both produce identical records wherever the previous classifier
+  was right, returning the number of lines it got wrong."""
+  wrong = 0
+  for (chain_record, table_record) in itertools.zip_longest(records(chain_days, path), records(table_days, path)):
+    if chain_record[1] == "NOTICE" and chain_record[3] == "":
+      wrong += chain_record[1] != table_record[1]
+      continue
+    assert chain_record == table_record, "Converters disagree: {} {}".format(chain_record, table_record)
+  return wrong
+
+
+def run(days, path):
+  """Convert the log at path, returning (seconds, lines)."""
+  start = time.perf_counter()
+  lines = 0
+  for record in records(days, path):
+    lines += 1
+  return (time.perf_counter() - start, lines)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--lines", type=int, default=2000000, help="Number of lines in the corpus.")
+  parser.add_argument("--days", type=int, default=30, help="Number of days to spread them over.")
+  arguments = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "toykeeper.log")
+    corpus.write_toykeeper(path, arguments.lines, arguments.days)
+    wrong = check(path)
+    (chain_time, lines) = run(chain_days, path)
+    (table_time, lines) = run(table_days, path)
+  for (name, elapsed) in (("classifier chain", chain_time), ("single pass", table_time)):
+    print("{:<18}{:>12.0f} lines/sec".format(name, lines / elapsed))
+  print("speedup {:.2f}x, {} server lines that the classifier chain made notices".format(chain_time / table_time, wrong))
+
+
+if __name__ == "__main__":
+  main()
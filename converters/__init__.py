@@ -1 +1,46 @@
- 
+import importlib
+
+import itertools
+
+import os
+
+import re
+
+from utilities.compression import open_log
+
+# The log formats that can be converted, each with the module converting it and
+# a pattern matching the start of the lines of its logs. A converter module is
+# only imported once a log is converted from its format, and the patterns let
+# the format of a log be recognised without importing any of them.
+formats = {"energymech":("converters.energymech", re.compile(r"\[\d\d:\d\d:\d\d\] ")),
+           "toykeeper":("converters.toykeeper", re.compile(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d \S[^\t]*\t"))}
+
+def register(format, module, pattern):
+  """Add a log format converted by the named module, whose lines match pattern."""
+  formats[format] = (module, re.compile(pattern))
+
+def load(format):
+  """Import and return the converter module for a log format."""
+  if format not in formats:
+    raise ValueError("Given format " + str(format).upper() + " has no valid converter.")
+  return importlib.import_module(formats[format][0])
+
+def sniff(logs, lines=20):
+  """Return the format of a log file, or of the first log file in a directory,
+  from the first lines of it.
+
+  The format matching the most of them wins, a ValueError is raised if none
+  match any."""
+  if os.path.isdir(logs):
+    files = sorted(filename for filename in os.listdir(logs) if os.path.getsize(os.path.join(logs, filename)))
+    if not files:
+      raise ValueError("Cannot work out the format of the logs in " + logs + ", it has no log files.")
+    logs = os.path.join(logs, files[0])
+  with open_log(logs, 'r', encoding='latin-1') as log:
+    sample = list(itertools.islice(log, lines))
+  matches = dict((format, sum(1 for line in sample if pattern.match(line)))
+                 for (format, (module, pattern)) in formats.items())
+  format = max(matches, key=matches.get)
+  if not matches[format]:
+    raise ValueError("Cannot work out the format of " + logs + ", give it with --format.")
+  return format
@@ -6,89 +6,407 @@ import datetime
 
 import string
 
+import collections
+
+import itertools
+
 from utilities.time2seconds import time2seconds
 
-def convert(directory, output_handler=None, utc_offset=None):
+from utilities.compression import open_log, is_compressed
+
+from utilities.records import renumber, filter_types
+
+from utilities.pipeline import prefetch, read_lines, write_behind
+
+from sys import intern
+
+def convert(directory, output_handler=None, utc_offset=None, jobs=1, manifest=None, pipeline=False,
+            since=None, until=None, types=None, cache=None):
   """Run the energymech log converters conversion function."""
-  return energymech_converter.energymech_conv(directory, output_handler)
+  return energymech_converter.energymech_conv(directory, output_handler, jobs, manifest, pipeline,
+                                              since, until, types, cache)
+
+def follow(directory, output_handler, state, interval=1.0, types=None):
+  """Run the energymech log converters follow function."""
+  return energymech_converter.energymech_follow(directory, output_handler, state, interval, types)
 
 class energymech_converter():
   """Convert an energymech log file to python datastructures."""
-  def energymech_conv(directory, output_handler):
-    """Convert a set of log files in energymech format to JSON or SQLite."""
+  def energymech_conv(directory, output_handler, jobs=1, manifest=None, pipeline=False,
+                      since=None, until=None, types=None, cache=None):
+    """Convert a set of log files in energymech format to JSON or SQLite.
+
+    With jobs greater than one the day files are parsed in a pool of worker 
+    processes, output stays in date order and line ids match the serial path.
+
+    Given a ConversionManifest only files that are new or changed since the 
+    manifest was last saved are converted, and of files that have only grown 
+    just the appended lines, so the output handler should append to an 
+    existing output. Only complete lines are converted, a last line still 
+    being written is left for the next run, see energymech_complete. Ctrl-C 
+    then stops the conversion between days, see DeferredInterrupt, with every 
+    day written recorded in the manifest.
+
+    With pipeline set, files are read ahead in one thread and days written 
+    out in another while the current file is parsed, see 
+    energymech_pipelined_days.
+
+    Only files dated from since to until, inclusive, are converted, the dates 
+    coming from the filenames so the others are never opened. Given a set of 
+    types only lines of those types are kept.
+
+    Given a ParseCache the records of each file are loaded from it when the 
+    file was parsed before and stored in it otherwise, see 
+    energymech_cached_days."""
     if not os.path.isdir(directory): 
       raise ValueError(directory + " is not a directory.")
     files = os.listdir(directory) 
     files.sort()
+    if since or until:
+      (first, last) = (since.strftime("%Y%m%d") if since else "", until.strftime("%Y%m%d") if until else "~")
+      files = [filename for filename in files 
+               if first <= energymech_converter.energymech_datestring(filename) <= last]
+
+    if manifest:
+      plan = [(filename, manifest.plan(os.path.join(directory, filename))) for filename in files]
+      plan = [(filename, skip_lines) for (filename, skip_lines) in plan if skip_lines is not None]
+      total_lines = manifest.next_line_id
+    else:
+      plan = [(filename, 0) for filename in files]
+      total_lines = 0
+    complete = manifest is not None
 
     if output_handler:
       output_handler.begin()
     else:
       logs = {}
       
-    day = []
-    total_lines = 0
-    for filename in files:
-      datestring = filename.split("_")[2].split(".")[0] #See "Misc 0" in project file.
-      logdate = time.strptime(datestring, "%Y%m%d")
-      date_timestamp = int(time.mktime(logdate))
-      logpath = os.path.join(directory, filename)
-      log_lines = energymech_converter.energymech_parse(logpath, total_lines)
-      if output_handler:
-        output_handler.write_day({date_timestamp:log_lines[1]})
-      else:
-        logs[date_timestamp] = log_lines[1]
-      total_lines += log_lines[0]
+    if jobs > 1:
+      days = energymech_converter.energymech_parallel_days(directory, plan, total_lines, manifest, jobs, cache,
+                                                           complete)
+    elif cache:
+      days = energymech_converter.energymech_cached_days(directory, plan, total_lines, manifest, cache, complete)
+    elif pipeline:
+      days = energymech_converter.energymech_pipelined_days(directory, plan, total_lines, manifest, complete)
+    else:
+      days = energymech_converter.energymech_days(directory, plan, total_lines, manifest, complete)
+    if types:
+      days = filter_types(days, types)
+    if output_handler and pipeline:
+      write_behind(output_handler, days)
+    else:
+      from utilities.manifest import DeferredInterrupt
+      with DeferredInterrupt(manifest is not None) as interrupt:
+        for (date_timestamp, log_lines) in days:
+          interrupt.check()
+          if output_handler:
+            output_handler.write_day({date_timestamp:log_lines})
+          else:
+            logs[date_timestamp] = list(log_lines)
+        interrupt.check()
     if output_handler:
       output_handler.close()
-    else:
+    if manifest:
+      manifest.save()
+    if not output_handler:
       return (logs)
 
-  def energymech_parse(filepath, total_lines):
-    """Take a single log file in energymech format and parse it into a python datastructure."""
-    log = open(filepath, 'r', encoding="latin-1")
-    lines = log.readlines()
-    tokenlist = []
+  def energymech_follow(directory, output_handler, state, interval=1.0, types=None):
+    """Convert the lines written to the newest log file in a directory as 
+    energymech appends them, moving on to the next day's file once it is 
+    created, until interrupted. See utilities.follow.follow.
+
+    state is a FollowState, converting carries on from the file, offset and 
+    line id it holds, and it is kept up to date as lines are converted."""
+    from utilities.follow import follow
+    if not os.path.isdir(directory): 
+      raise ValueError(directory + " is not a directory.")
+
+    def newest():
+      files = os.listdir(directory)
+      return os.path.join(directory, max(files)) if files else None
+
+    def parse(filepath, lines, line_id):
+      days = [(energymech_converter.energymech_filedate(os.path.basename(filepath)),
+               list(energymech_converter.energymech_parse_lines(lines, line_id)))]
+      return filter_types(days, types) if types else days
+
+    follow(newest, parse, output_handler, state, interval)
+
+  def energymech_datestring(filename):
+    """Return the YYYYMMDD date string of an energymech log filename."""
+    return filename.split("_")[2].split(".")[0] #See "Misc 0" in project file.
+
+  def energymech_filedate(filename):
+    """Return the timestamp of the date given in an energymech log filename."""
+    datestring = energymech_converter.energymech_datestring(filename)
+    logdate = time.strptime(datestring, "%Y%m%d")
+    return int(time.mktime(logdate))
+
+  def energymech_days(directory, plan, total_lines, manifest, complete=False):
+    """Yield (date_timestamp, records) for each (filename, skip_lines) in the 
+    plan in turn, streaming the records of each day as they are read. With 
+    complete set only complete lines are read, see energymech_parse."""
+    for (filename, skip_lines) in plan:
+      date_timestamp = energymech_converter.energymech_filedate(filename)
+      logpath = os.path.join(directory, filename)
+      line_count = []
+      log_lines = energymech_converter.energymech_count(logpath, total_lines, line_count, skip_lines, complete)
+      yield (date_timestamp, log_lines)
+      total_lines += line_count[0]
+      if manifest:
+        manifest.record(logpath, skip_lines + line_count[0])
+        manifest.next_line_id = total_lines
+
+  def energymech_cached_days(directory, plan, total_lines, manifest, cache, complete=False):
+    """Yield (date_timestamp, records) for each (filename, skip_lines) in the 
+    plan in turn, with the records of each file parsed into a list through the 
+    ParseCache cache, so that files parsed before are only read to be hashed.
+
+    Each entry holds (first_line_id, lines_in_file, records) as the file was 
+    first converted, and converting the same files again gives it the same 
+    line ids, so its records only need renumbering when earlier files changed."""
+    for (filename, skip_lines) in plan:
+      logpath = os.path.join(directory, filename)
+      parse = lambda: [(total_lines,) + energymech_converter.energymech_parse_file(logpath, skip_lines, total_lines,
+                                                                                    complete)]
+      [parsed] = cache.cached(logpath, parse, __name__, skip_lines, complete)
+      (lines_in_file, log_lines) = energymech_converter.energymech_renumbered(parsed, total_lines)
+      yield (energymech_converter.energymech_filedate(filename), log_lines)
+      total_lines += lines_in_file
+      if manifest:
+        manifest.record(logpath, skip_lines + lines_in_file)
+        manifest.next_line_id = total_lines
+
+  def energymech_pipelined_days(directory, plan, total_lines, manifest, complete=False):
+    """Yield (date_timestamp, records) for each (filename, skip_lines) in the 
+    plan in turn, with the records of each day parsed into a list.
+
+    The lines of the next few files are read, and decompressed, in a reader 
+    thread while the current one is parsed, so that slow storage overlaps 
+    with parsing. The reader stops a bounded number of files ahead."""
+    def read(plan):
+      for (filename, skip_lines) in plan:
+        logpath = os.path.join(directory, filename)
+        lines = itertools.chain.from_iterable(read_lines(logpath, skip_lines))
+        if complete and not is_compressed(logpath):
+          lines = energymech_converter.energymech_complete(lines)
+        yield (filename, logpath, skip_lines, list(lines))
+
+    for (filename, logpath, skip_lines, lines) in prefetch(read(plan)):
+      log_lines = list(energymech_converter.energymech_parse_lines(lines, total_lines))
+      yield (energymech_converter.energymech_filedate(filename), log_lines)
+      total_lines += len(lines)
+      if manifest:
+        manifest.record(logpath, skip_lines + len(lines))
+        manifest.next_line_id = total_lines
+
+  def energymech_parallel_days(directory, plan, total_lines, manifest, jobs, cache=None, complete=False):
+    """Yield (date_timestamp, records) for each (filename, skip_lines) in the 
+    plan in turn, parsing up to jobs files at once in worker processes.
+
+    Workers number their lines from zero, line ids are then shifted by the 
+    running sum of the line counts of every earlier file. Only a bounded 
+    window of files is in flight so memory stays proportional to jobs.
+
+    Given a ParseCache, files in it are loaded rather than sent to a worker, 
+    and the others stored in it once renumbered, as in energymech_cached_days."""
+    import multiprocessing
+    import signal
+    # Ctrl-C is left to the main process, which stops the pool when it is done with it.
+    with multiprocessing.Pool(jobs, signal.signal, (signal.SIGINT, signal.SIG_IGN)) as pool:
+      pending = collections.deque()
+      planned = iter(plan)
+      while True:
+        while len(pending) < jobs * 2:
+          (filename, skip_lines) = next(planned, (None, None))
+          if filename is None:
+            break
+          logpath = os.path.join(directory, filename)
+          (key, cached) = (None, None)
+          if cache:
+            key = cache.key(logpath, __name__, skip_lines, complete)
+            cached = cache.load(key)
+          if cached is not None:
+            [result] = cached
+          else:
+            result = pool.apply_async(energymech_converter.energymech_parse_file, (logpath, skip_lines, 0, complete))
+          pending.append((logpath, skip_lines, energymech_converter.energymech_filedate(filename), key, result))
+        if not pending:
+          break
+        (logpath, skip_lines, date_timestamp, key, result) = pending.popleft()
+        if isinstance(result, tuple):
+          (lines_in_file, log_lines) = energymech_converter.energymech_renumbered(result, total_lines)
+        else:
+          (lines_in_file, log_lines) = result.get()
+          if total_lines:
+            log_lines = [renumber(line, total_lines) for line in log_lines]
+          if cache:
+            for parsed in cache.store(key, [(total_lines, lines_in_file, log_lines)]):
+              pass
+        yield (date_timestamp, log_lines)
+        total_lines += lines_in_file
+        if manifest:
+          manifest.record(logpath, skip_lines + lines_in_file)
+          manifest.next_line_id = total_lines
+
+  def energymech_parse_file(filepath, skip_lines=0, total_lines=0, complete=False):
+    """Parse a whole log file with line ids starting from total_lines, returning 
+    (lines_in_file, records). Used by the worker processes of energymech_parallel_days."""
+    line_count = []
+    log_lines = list(energymech_converter.energymech_count(filepath, total_lines, line_count, skip_lines, complete))
+    return (line_count[0], log_lines)
+
+  def energymech_renumbered(parsed, total_lines):
+    """Return (lines_in_file, records) from a cached (first_line_id, lines_in_file, 
+    records), with line ids starting from total_lines."""
+    (first_line_id, lines_in_file, log_lines) = parsed
+    if first_line_id != total_lines:
+      log_lines = [renumber(line, total_lines - first_line_id) for line in log_lines]
+    return (lines_in_file, log_lines)
+
+  def energymech_count(filepath, total_lines, line_count, skip_lines=0, complete=False):
+    """Stream the records of a log file, appending the number of lines read to 
+    line_count once the stream is exhausted."""
+    lines_in_file = yield from energymech_converter.energymech_parse(filepath, total_lines, skip_lines, complete)
+    line_count.append(lines_in_file)
+
+  def energymech_parse(filepath, total_lines, skip_lines=0, complete=False):
+    """Take a single log file in energymech format and yield its lines as python 
+    datastructures one at a time, reading the file incrementally and decompressing 
+    it on the fly if it is compressed. The generator returns the number of lines 
+    read from the file once exhausted.
+
+    The first skip_lines lines of the file are passed over without being parsed 
+    or counted. With complete set, a last line of an uncompressed file that has 
+    no newline yet is left out too, see energymech_complete.
+
+    Lines are yielded as tuples with interned nicknames.
+
+    Each line is split once into timestamp, first token and the rest. PRIVMSGs, 
+    the vast majority of lines, are recognised from that alone, other lines are 
+    dispatched through line_parsers on the first character of the first token 
+    and split only as far as their type needs. Anything not recognised goes to 
+    energymech_parse_line, which gives identical results for the common types 
+    and also handles the rare ones."""
+    with open_log(filepath, 'r', encoding="latin-1") as log:
+      lines = itertools.islice(log, skip_lines, None)
+      if complete and not is_compressed(filepath):
+        lines = energymech_converter.energymech_complete(lines)
+      return (yield from energymech_converter.energymech_parse_lines(lines, total_lines))
+
+  def energymech_complete(lines):
+    """Yield lines up to a last one with no newline at its end, which energymech 
+    is still writing. Leaving it for the next run, as the manifest only records 
+    the file up to its last newline, converts it once, with all of its text."""
+    for line in lines:
+      if line[-1:] != "\n":
+        return
+      yield line
+
+  def energymech_parse_lines(lines, total_lines):
+    """Yield the records of an iterable of energymech log lines as described for 
+    energymech_parse, returning the number of lines once exhausted."""
+    line_parsers = energymech_converter.line_parsers
+    parse_line = energymech_converter.energymech_parse_line
     lines_in_file = 0
     for line in lines:
-      type_parse = line.split(" ", 2) # Temporary three token space parse to determine type of line.
-      space_parse = line.split(" ") # Turns every space seperation into a token, doesn't handle closures such as closed parentheses intelligently.
-      timestamp = time2seconds(type_parse[0][1:-1])
       line_id = total_lines + lines_in_file
-      if type_parse[1] != "***" and type_parse[1][0] == "<":
-        (nickname, message) = (type_parse[1][1:-1], type_parse[2][:-1])
-        tokenlist.append([line_id, "PRIVMSG", timestamp, nickname, message])
-      elif type_parse[1] == "*":
-        me_elements = line.split(" ", 3)
-        (nickname, message) = (me_elements[2], "/me " + me_elements[3][:-1])
-        tokenlist.append([line_id, "PRIVMSG", timestamp, nickname, message]) 
-      elif ''.join((type_parse[1][0], type_parse[1][-1])) == "--":
-        (nickname, message) = (type_parse[1][1:-1], type_parse[2][:-1])
-        tokenlist.append([line_id, "NOTICE", timestamp, nickname, message])
-      elif space_parse[2] == "Joins:":
-        (nickname, hostname) = (space_parse[3], space_parse[4][1:-2])
-        tokenlist.append([line_id, "JOIN", timestamp, nickname, hostname])
-      elif space_parse[2] == "Parts:":
-        part_elements = line.split(" ", 5)[3:]
-        (nickname, hostname, part_message) = (part_elements[0], part_elements[1][1:-1], part_elements[2][1:-2])
-        tokenlist.append([line_id, "PART", timestamp, nickname, hostname, part_message])
-      elif space_parse[2] == "Quits:":
-        quit_elements = line.split(" ", 5)[3:]
-        (nickname, hostname, quit_message) = (quit_elements[0], quit_elements[1][1:-1], quit_elements[2][1:-2])
-        tokenlist.append([line_id, "QUIT", timestamp, nickname, hostname, quit_message])
-      elif ''.join(space_parse[3:5]) == "waskicked":
-        (nick_kicked, kicked_by, kick_message) = (space_parse[2], space_parse[6], space_parse[7][1:-2])
-        tokenlist.append([line_id, "KICK", timestamp, nick_kicked, kicked_by, kick_message])
-      elif ''.join(space_parse[4:7]) == "nowknownas":
-        (nick_before, nick_after) = (space_parse[2], space_parse[-1][:-1])
-        tokenlist.append([line_id, "NICK", timestamp, nick_before, nick_after])
-      elif ''.join(space_parse[3:5]) == "setsmode:":
-        setmode_elements = line.split(" ", 5)
-        (set_by, mode_string) = (setmode_elements[2], setmode_elements[5][:-1])
-        tokenlist.append([line_id, "SETMODE", timestamp, set_by, mode_string])
-      elif ''.join(space_parse[3:5]) == "changestopic":
-        topic_element = line.split(" ", 6)[6]
-        (changed_by, topic) = (space_parse[2], topic_element[:-1])
-        tokenlist.append([line_id, "TOPIC", timestamp, changed_by, topic])
       lines_in_file += 1
-    return (lines_in_file, tokenlist)
+      type_parse = line.split(" ", 2)
+      record = None
+      if len(type_parse) == 3:
+        token = type_parse[1]
+        if token[:1] == "<":
+          yield (line_id, "PRIVMSG", time2seconds(type_parse[0][1:-1]), intern(token[1:-1]), type_parse[2][:-1])
+          continue
+        line_parser = line_parsers.get(token[:1])
+        if line_parser:
+          record = line_parser(line_id, time2seconds(type_parse[0][1:-1]), token, type_parse[2])
+      if record is None:
+        record = parse_line(line, line_id)
+      if record:
+        yield record
+    return lines_in_file
+
+  def energymech_notice(line_id, timestamp, token, rest):
+    """Parse '-nick- message'."""
+    if token[-1] == "-":
+      return (line_id, "NOTICE", timestamp, intern(token[1:-1]), rest[:-1])
+
+  def energymech_star(line_id, timestamp, token, rest):
+    """Parse '* nick action' and the events of '***' lines."""
+    if token == "*":
+      me_elements = rest.split(" ", 1)
+      if len(me_elements) == 2:
+        return (line_id, "PRIVMSG", timestamp, intern(me_elements[0]), "/me " + me_elements[1][:-1])
+    elif token == "***":
+      event_elements = rest.split(" ", 1)
+      event_parser = energymech_converter.event_parsers.get(event_elements[0])
+      if event_parser and len(event_elements) == 2:
+        return event_parser(line_id, timestamp, event_elements[1])
+
+  def energymech_join(line_id, timestamp, event):
+    """Parse '*** Joins: nick (user@host)'."""
+    join_elements = event.split(" ", 2)
+    if len(join_elements) > 1:
+      return (line_id, "JOIN", timestamp, intern(join_elements[0]), join_elements[1][1:-2])
+
+  def energymech_part(line_id, timestamp, event):
+    """Parse '*** Parts: nick (user@host) (message)'."""
+    part_elements = event.split(" ", 2)
+    if len(part_elements) == 3:
+      return (line_id, "PART", timestamp, intern(part_elements[0]), part_elements[1][1:-1], part_elements[2][1:-2])
+
+  def energymech_quit(line_id, timestamp, event):
+    """Parse '*** Quits: nick (user@host) (message)'."""
+    quit_elements = event.split(" ", 2)
+    if len(quit_elements) == 3:
+      return (line_id, "QUIT", timestamp, intern(quit_elements[0]), quit_elements[1][1:-1], quit_elements[2][1:-2])
+
+  # Parsers by the first character of the token after the timestamp, and for 
+  # '***' lines by the word that follows. Each returns None for a line it can't handle.
+  line_parsers = {"-":energymech_notice, "*":energymech_star}
+  event_parsers = {"Joins:":energymech_join, "Parts:":energymech_part, "Quits:":energymech_quit}
+
+  def energymech_parse_line(line, line_id):
+    """Parse any single line by splitting it fully and testing each type in turn, 
+    returning None for lines of no known type."""
+    type_parse = line.split(" ", 2) # Temporary three token space parse to determine type of line.
+    space_parse = line.split(" ") # Turns every space seperation into a token, doesn't handle closures such as closed parentheses intelligently.
+    timestamp = time2seconds(type_parse[0][1:-1])
+    if type_parse[1] != "***" and type_parse[1][0] == "<":
+      (nickname, message) = (type_parse[1][1:-1], type_parse[2][:-1])
+      return (line_id, "PRIVMSG", timestamp, intern(nickname), message)
+    elif type_parse[1] == "*":
+      me_elements = line.split(" ", 3)
+      (nickname, message) = (me_elements[2], "/me " + me_elements[3][:-1])
+      return (line_id, "PRIVMSG", timestamp, intern(nickname), message)
+    elif ''.join((type_parse[1][0], type_parse[1][-1])) == "--":
+      (nickname, message) = (type_parse[1][1:-1], type_parse[2][:-1])
+      return (line_id, "NOTICE", timestamp, intern(nickname), message)
+    elif space_parse[2] == "Joins:":
+      (nickname, hostname) = (space_parse[3], space_parse[4][1:-2])
+      return (line_id, "JOIN", timestamp, intern(nickname), hostname)
+    elif space_parse[2] == "Parts:":
+      part_elements = line.split(" ", 5)[3:]
+      (nickname, hostname, part_message) = (part_elements[0], part_elements[1][1:-1], part_elements[2][1:-2])
+      return (line_id, "PART", timestamp, intern(nickname), hostname, part_message)
+    elif space_parse[2] == "Quits:":
+      quit_elements = line.split(" ", 5)[3:]
+      (nickname, hostname, quit_message) = (quit_elements[0], quit_elements[1][1:-1], quit_elements[2][1:-2])
+      return (line_id, "QUIT", timestamp, intern(nickname), hostname, quit_message)
+    elif ''.join(space_parse[3:5]) == "waskicked":
+      (nick_kicked, kicked_by, kick_message) = (space_parse[2], space_parse[6], space_parse[7][1:-2])
+      return (line_id, "KICK", timestamp, intern(nick_kicked), intern(kicked_by), kick_message)
+    elif ''.join(space_parse[4:7]) == "nowknownas":
+      (nick_before, nick_after) = (space_parse[2], space_parse[-1][:-1])
+      return (line_id, "NICK", timestamp, intern(nick_before), intern(nick_after))
+    elif ''.join(space_parse[3:5]) == "setsmode:":
+      setmode_elements = line.split(" ", 5)
+      (set_by, mode_string) = (setmode_elements[2], setmode_elements[5][:-1])
+      return (line_id, "SETMODE", timestamp, intern(set_by), mode_string)
+    elif ''.join(space_parse[3:5]) == "changestopic":
+      topic_element = line.split(" ", 6)[6]
+      (changed_by, topic) = (space_parse[2], topic_element[:-1])
+      return (line_id, "TOPIC", timestamp, intern(changed_by), topic)
@@ -1,211 +1,412 @@
-import json
+
+import collections
+
+import itertools
+
+import mmap
+
+import os
 
 import time
 
 from datetime import timedelta
 
-from calendar import timegm
-
 from utilities.time2seconds import time2seconds
 
+from utilities.compression import open_log, is_compressed, read_mapped
+
+from utilities.records import renumber, filter_types
+
+from utilities.pipeline import prefetch, read_lines, read_range, write_behind
+
+from sys import intern
+
 
-def convert(filepath, output_handler=None, utc_offset=None):
+def convert(filepath, output_handler=None, utc_offset=None, jobs=1, pipeline=False,
+            since=None, until=None, types=None, cache=None):
   """Run ToyKeeperConverter's conversion function and return the result."""
-  return ToyKeeperConverter.toykeeper_conv(ToyKeeperConverter,filepath, output_handler, utc_offset)
+  return ToyKeeperConverter.toykeeper_conv(ToyKeeperConverter,filepath, output_handler, utc_offset, jobs, pipeline,
+                                           since, until, types, cache)
+
+def follow(filepath, output_handler, state, utc_offset=None, interval=1.0, types=None):
+  """Run ToyKeeperConverter's follow function."""
+  return ToyKeeperConverter.toykeeper_follow(ToyKeeperConverter, filepath, output_handler, state, utc_offset,
+                                             interval, types)
 
 
 class ToyKeeperConverter():
   """Converts a custom log format of the form iso standard date, nick and message to json or sqlite."""
 
 
-  def toykeeper_conv(cls, filepath, output_handler, utc_offset):
+  def toykeeper_conv(cls, filepath, output_handler, utc_offset, jobs=1, pipeline=False,
+                     since=None, until=None, types=None, cache=None):
+    """Convert a log file in ToyKeeper format to JSON or SQLite.
+
+    Uncompressed files are read through mmap. With jobs greater than one the file 
+    is split into byte ranges at day boundaries which are parsed in a pool of worker 
+    processes, output stays in date order and line ids match the serial path.
+
+    With pipeline set the file is instead read, and decompressed, a block at a 
+    time in a reader thread and days are written out in a writer thread, while 
+    the calling thread parses.
+
+    Only lines logged on dates from since to until, inclusive, are converted. 
+    In an uncompressed file the first and last of them are found by bisecting 
+    the file, which is sorted by date, otherwise lines are passed over until 
+    the first date and reading stops after the last. The dates are those in the 
+    log, before any UTC offset is applied. Given a set of types only lines of 
+    those types are kept.
+
+    Given a ParseCache the days of the whole file are loaded from it if the 
+    file was converted before, and otherwise stored in it as they are 
+    converted. Converting only some dates bypasses the cache."""
  
     if output_handler:
       output_handler.begin()
     else:
       logs = {}       
 
-    def process_line(line_id, line, offset):
-      components = (lambda space_split : (space_split[0], space_split[1], 
-                                          space_split[2].split("\t")[0], 
-                                          space_split[2].split("\t")[1])) \
-                                          (line.split(" ", 2))
-      (date, timestamp, hostmask, contents) = (components[0], components[1], 
-                                               components[2], components[3])
-      line_type = cls.toykeeper_linetype(hostmask, contents)
-      (offset_timestamp, offset_datestamp) = cls.calculate_offset(date, timestamp, offset)
-      converted_line = cls.construct(line_id, line_type, offset_timestamp, hostmask, contents)
-      return {"converted_line":converted_line, "offset_datestamp":offset_datestamp, 
-              "date":date, "timestamp":timestamp, "hostmask":hostmask, "contents":contents}
-  
-    def shift_day(day,current_date) :
-      if output_handler:
-        output_handler.write_day({current_date:day})
-      else:
-        logs[current_date] = list(day)
-
-    day = []
-    logfile = open(filepath, 'r', encoding='latin-1')
-    current_date = int(time.mktime(time.strptime(logfile.readline().split(" ")[0], "%Y-%m-%d")))
-    line_id = 0
+    compressed = is_compressed(filepath)
+    window = (0, None)
+    if (since or until) and not compressed:
+      window = cls.toykeeper_window(filepath, since, until)
 
+    def parse():
+      if jobs > 1 and not compressed:
+        return cls.toykeeper_parallel_days(cls, filepath, utc_offset, jobs, window)
+      elif pipeline:
+        blocks = read_lines(filepath) if compressed else read_range(filepath, *window)
+        fields = cls.toykeeper_line_fields(itertools.chain.from_iterable(prefetch(blocks)))
+        if compressed:
+          fields = cls.toykeeper_date_filter(fields, since, until)
+        return cls.toykeeper_days(cls, fields, 0, utc_offset)
+      fields = cls.toykeeper_fields(filepath, *window)
+      if compressed:
+        fields = cls.toykeeper_date_filter(fields, since, until)
+      return cls.toykeeper_days(cls, fields, 0, utc_offset)
 
-    for line in logfile:
-      line_elements = process_line(line_id, line, utc_offset)
-      day.append(line_elements["converted_line"])
-      if int(line_elements["offset_datestamp"]) > current_date:
-        shift_day(day,current_date)
-        current_date = int(line_elements["offset_datestamp"])
-        day = []
+    if cache and not (since or until):
+      days = cache.cached(filepath, parse, __name__, utc_offset)
+    else:
+      days = parse()
+    if types:
+      days = filter_types(days, types)
 
-      line_id += 1  
-    
-    #Final shift_day to account for no date change at the end.
-    shift_day(day,current_date)
+    if output_handler and pipeline:
+      write_behind(output_handler, days)
+    else:
+      for (current_date, day) in days:
+        if output_handler:
+          output_handler.write_day({current_date:day})
+        else:
+          logs[current_date] = day
     
     if output_handler:
       output_handler.close()
     else:
       return logs
 
-  
-  def toykeeper_linetype(hostmask, contents):
-    """Classify lines according to their contents and return a dictionary of the 
-    form {line_id:line_type...}
-    
-    Keyword arguments:
-      hostmask | The hostmask given as the source for the line. 
-      contents | The actual message of the line.
-    """
-    line_types = {}
-    if hostmask[0] + hostmask[-1] == "<>":
-      line_type = "PRIVMSG"
-    elif hostmask[0] + hostmask[-1] == "[]" and contents[0:6] == "ACTION":
-      line_type = "ACTION"
-    elif hostmask[0] + hostmask[-1] == "--":
-      content_split = contents.split(" ")
-      if hostmask == "-dircproxy-":
-        if contents == "You connected\n":
-          line_type = "CONNECTED"
-        elif contents == "You disconnected\n":
-          line_type = "DISCONNECTED"
-      elif contents == "You joined the channel\n":
-        line_type = "JOINED"
-      """Notices use '--' to denote themselves and have no distinguishing marks besides, 
-      we start by filtering out those with lengths too short for the 
-      other tests.
-      """
-      if len(content_split) < 3: 
-        line_type = "NOTICE"
-      elif content_split[2] == "joined":
-        line_type = "JOIN"
-      elif content_split[2] == "left":
-        line_type = "PART"
-      elif content_split[1] + content_split[2] == "kickedoff":
-        line_type = "KICK"
-      elif content_split[0][0] + content_split[0][-1] == "[]":
-        line_type = "NOTICE"
-      try:
-        if (content_split[1] + content_split[2]  == "changedmode:" or 
-        content_split[2] + content_split[3] == "changedmode:"):
-          line_type = "SETMODE"
-        elif (content_split[1] + content_split[2] == "changedtopic:" or 
-        content_split[2] + content_split[3] == "changedtopic:"):
-          line_type = "TOPIC"
-      except IndexError:
-        line_type = "NOTICE"
-      if contents[0:4] == "CTCP":
-        line_type = "CTCP"
+
+  def toykeeper_follow(cls, filepath, output_handler, state, utc_offset=None, interval=1.0, types=None):
+    """Convert the lines of a log file in ToyKeeper format as they are appended 
+    to it, until interrupted. See utilities.follow.follow.
+
+    state is a FollowState, converting carries on from the offset and line id it 
+    holds, and it is kept up to date as lines are converted."""
+    from utilities.follow import follow
+    if not os.path.isfile(filepath):
+      raise ValueError(filepath + " is not a file.")
+
+    def parse(filepath, lines, line_id):
+      days = cls.toykeeper_days(cls, cls.toykeeper_line_fields(lines), line_id, utc_offset)
+      return filter_types(days, types) if types else days
+
+    follow(lambda: filepath, parse, output_handler, state, interval)
+
+
+  def toykeeper_days(cls, fields, line_id, utc_offset, line_count=None):
+    """Convert (date, timestamp, hostmask, contents) fields into days of lines,
+    yielding (date_timestamp, lines) for each day in turn. Line ids start from 
+    line_id, and the number of lines converted is appended to line_count.
+
+    PRIVMSGs, the vast majority of lines, are built here directly, the rest by 
+    toykeeper_record. Lines of no known type are left out but keep their line id."""
+    (record, calculate_offset) = (cls.toykeeper_record, cls.calculate_offset)
+    day = []
+    current_date = None
+    lines = 0
+    for (date, timestamp, hostmask, contents) in fields:
+      (offset_timestamp, offset_datestamp) = calculate_offset(date, timestamp, utc_offset)
+      if hostmask[:1] == "<":
+        converted_line = (line_id + lines, "PRIVMSG", offset_timestamp, intern(hostmask[1:-1]), contents)
       else:
-        line_type = "NOTICE"
-    return line_type
-
-
-  def construct(line_id, line_type, time_, hostmask, contents):
-    """Construct a line suitable for output in line with the generic python format energymech log converter uses."""
-    def type_is(linetype): return (line_type == linetype)
-    universal = (line_id, line_type, time_)
-    contents = contents[:-1] # Strip trailing newlines
-    hostmask = hostmask[1:-1] # Strip buffer characters '<>', '[]', '--'
-    if type_is("PRIVMSG") or type_is("ACTION") or type_is("NOTICE") or type_is("CTCP"):
-      return universal + (hostmask, contents)
-    
-    content_split = contents.split(" ")
-    if type_is("JOIN") or type_is("PART"):
-      userhost = cls.strip_hostmask(content_split[1])
-      (nick, user, hostname) = (content_split[0], userhost[0], userhost[1])
-      hostmask = cls.construct_hostmask(nick, user, hostname)
-      return universal + (hostmask,)
-    elif type_is("KICK"):
-      kick_split = contents.split(" ", 6)
-      userhost = cls.strip_hostmask(kick_split[5])
-      (nick, user, hostname) = (kick_split[4], userhost[0], userhost[1])
-      hostmask = cls.construct_hostmask(nick, user, hostname)
-      (nick_kicked, kick_message) = (kick_split[0], kick_split[6])
-      return universal + (nick_kicked, hostmask, kick_message)
-    elif type_is("SETMODE"):
-      setmode_split = contents.split(" ", 3) # The size of setmode varies so we assume it's the shorter version to avoid a ValueError
-      if setmode_split[2] == "mode:":
-        (set_by, mode_string) = (setmode_split[0], setmode_split[3])
-        return universal + (set_by, mode_string)
-      elif setmode_split[3] == "mode:":
-        setmode_split = contents.split(" ", 4)
-        userhost = cls.strip_hostmask(setmode_split[1])
-        nick = setmode_split[0]
-        user = hostmask_split[0]
-        hostname = hostmask_split[1]
-        set_by = cls.construct_hostmask(nick, user, hostname)
-        return universal + (set_by, setmode_split[4])
-    elif type_is("TOPIC"):
-      topic_split = contents.split(" ", 3) # The size of topicsplit varies so we assume it's the shorter version to avoid a ValueError
-      if topic_split[2] == "topic:":
-        (changed_by, topic) = (topic_split[0], topic_split[3])
-        return universal + (changed_by, topic)
-      elif topic_split[3] == "topic:":
-        topic_split = contents.split(" ", 4)
-        userhost = cls.strip_hostmask(topic_split[1])
-        (nick, user, hostname, topic) = (topic_split[0], userhost[0], 
-                                         userhost[1], topic_split[4])
-        changed_by = cls.construct_hostmask(nick, user, hostname)
-        return universal + (changed_by, topic)
-    elif type_is("JOINED") or type_is("CONNECTED") or type_is("DISCONNECTED"):
-      return universal
-    else:
-      raise ValueError("Given type was not in the types of message handled by the toykeeper converter.")
+        converted_line = record(line_id + lines, offset_timestamp, hostmask, contents)
+      lines += 1
+      if current_date is None:
+        current_date = offset_datestamp
+      elif offset_datestamp > current_date:
+        yield (current_date, day)
+        current_date = offset_datestamp
+        day = []
+      if converted_line:
+        day.append(converted_line)
 
+    if day:
+      yield (current_date, day)
+    if line_count is not None:
+      line_count.append(lines)
 
-  def strip_hostmask(cls, userhost):
-    """Strip characters from a set of hostmask components to prepare them for processing by construct_hostmask. (USER@HOSTNAME) OR (~USER@HOSTNAME)"""
-    userhost_components = userhost[1:-1].split("@")
-    if userhost_components[0][0] == "~":
-      return (userhost_components[0][1:], userhost_components[1])
-    else:
-      return (userhost_components[0], userhost_components[1])
+
+  def toykeeper_fields(filepath, start=0, end=None, block_size=1 << 20):
+    """Yield the (date, timestamp, hostmask, contents) fields of each line of a 
+    log file between two byte offsets, the contents without their newline.
+
+    Uncompressed files are memory mapped and decoded a block of whole lines at a 
+    time, each line is then split once on spaces and once on its tab. Compressed 
+    files are decompressed as a stream and can only be read whole."""
+    if is_compressed(filepath):
+      with open_log(filepath, 'r', encoding='latin-1') as logfile:
+        yield from ToyKeeperConverter.toykeeper_line_fields(logfile)
+      return
+    with open(filepath, 'rb') as logfile:
+      if os.fstat(logfile.fileno()).st_size == 0:
+        return
+      with mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ) as log:
+        end = len(log) if end is None else end
+        while start < end:
+          stop = min(start + block_size, end)
+          if stop < end:
+            stop = log.rfind(b"\n", start, stop) + 1 or log.find(b"\n", stop) + 1 or end
+          # As in the text mode read of the other paths, CRLF line endings are taken as LF.
+          lines = read_mapped(log, start, stop).decode('latin-1').replace("\r\n", "\n").split("\n")
+          if not lines[-1]:
+            lines.pop()
+          start = stop
+          for line in lines:
+            (date, timestamp, rest) = line.split(" ", 2)
+            (hostmask, contents) = rest.split("\t", 1)
+            yield (date, timestamp, hostmask, contents)
+
+
+  def toykeeper_line_fields(lines):
+    """Yield the (date, timestamp, hostmask, contents) fields of each of an 
+    iterable of lines that have already been decoded, the contents without 
+    their newline."""
+    for line in lines:
+      (date, timestamp, rest) = line.split(" ", 2)
+      (hostmask, contents) = rest.split("\t", 1)
+      yield (date, timestamp, hostmask, contents.rstrip("\n"))
+
+
+  def toykeeper_window(filepath, since, until):
+    """Return the byte range (start, end) of the lines of a log file dated from 
+    since to until inclusive, either of which may be None, by bisecting it."""
+    with open(filepath, 'rb') as logfile:
+      if os.fstat(logfile.fileno()).st_size == 0:
+        return (0, 0)
+      with mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ) as log:
+        start = ToyKeeperConverter.toykeeper_bisect(log, since.isoformat().encode()) if since else 0
+        end = ToyKeeperConverter.toykeeper_bisect(log, (until + timedelta(days=1)).isoformat().encode()) if until else len(log)
+    return (start, max(start, end))
+
+
+  def toykeeper_bisect(log, date):
+    """Return the offset of the first line of a mapped log dated on or after 
+    date, given as b"YYYY-MM-DD", or the end of the log if there is none."""
+    (low, high) = (0, len(log))
+    while low < high:
+      line_start = log.rfind(b"\n", 0, (low + high) // 2) + 1
+      if line_start < low:
+        line_start = low
+      if log[line_start:line_start + len(date)] < date:
+        low = log.find(b"\n", line_start) + 1 or len(log)
+      else:
+        high = line_start
+    return low
+
+
+  def toykeeper_date_filter(fields, since, until):
+    """Yield the fields of lines dated from since to until inclusive from a 
+    stream of fields sorted by date, stopping as soon as the window has passed."""
+    if since:
+      first = since.isoformat()
+      fields = itertools.dropwhile(lambda line: line[0] < first, fields)
+    if until:
+      last = until.isoformat()
+      fields = itertools.takewhile(lambda line: line[0] <= last, fields)
+    return fields
+
+
+  def toykeeper_day_ranges(filepath, parts, window=(0, None)):
+    """Split a log file, or the window (start, end) of it, into at most parts byte 
+    ranges (start, end) that each begin at the first line of a date, so no date 
+    spans two ranges."""
+    with open(filepath, 'rb') as logfile:
+      size = os.fstat(logfile.fileno()).st_size
+      (start, size) = (window[0], size if window[1] is None else window[1])
+      if size <= start:
+        return []
+      with mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ) as log:
+        boundaries = [start]
+        for part in range(1, parts):
+          position = max(start + part * (size - start) // parts, boundaries[-1])
+          # Move to the start of the next line, then on to the next change of date.
+          position = log.find(b"\n", position) + 1
+          if position <= 0 or position >= size:
+            break
+          date = log[position:log.find(b" ", position)]
+          while position < size and log[position:position + len(date) + 1] == date + b" ":
+            position = log.find(b"\n", position) + 1 or size
+          if position >= size:
+            break
+          if position > boundaries[-1]:
+            boundaries.append(position)
+        boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+  def toykeeper_parse_range(cls, filepath, start, end, utc_offset):
+    """Convert the lines of a byte range with line ids starting from zero, 
+    returning (lines_in_range, days). Used by the worker processes of toykeeper_parallel_days."""
+    line_count = []
+    days = list(cls.toykeeper_days(cls, cls.toykeeper_fields(filepath, start, end), 0, utc_offset, line_count))
+    return (line_count[0], days)
 
 
-  def construct_hostmask(nick, user, hostname):
-    """Takes a nick,user,hostname combo and constructs a string representing it like such: user!~username@127.0.0.1"""
-    return nick + "!~" + user + "@" + "hostname"  
+  def toykeeper_parallel_days(cls, filepath, utc_offset, jobs, window=(0, None)):
+    """Yield (date_timestamp, lines) for each day of a log file in turn, converting 
+    up to jobs byte ranges of it at once in worker processes.
 
+    Workers number their lines from zero, line ids are then shifted by the running 
+    sum of the line counts of every earlier range. Only a bounded window of ranges 
+    is in flight. A UTC offset can move lines across the dates ranges are split 
+    on, so a day continuing from one range into the next is joined back together 
+    before it is yielded."""
+    import multiprocessing
+    with multiprocessing.Pool(jobs) as pool:
+      pending = collections.deque()
+      ranges = iter(cls.toykeeper_day_ranges(filepath, jobs * 4, window))
+      total_lines = 0
+      held = None
+      while True:
+        while len(pending) < jobs * 2:
+          (start, end) = next(ranges, (None, None))
+          if start is None:
+            break
+          pending.append(pool.apply_async(cls.toykeeper_parse_range, (cls, filepath, start, end, utc_offset)))
+        if not pending:
+          break
+        (lines_in_range, days) = pending.popleft().get()
+        for (current_date, day) in days:
+          day = [renumber(line, total_lines) for line in day]
+          if held and held[0] == current_date:
+            held[1].extend(day)
+            continue
+          if held:
+            yield held
+          held = (current_date, day)
+        total_lines += lines_in_range
+      if held:
+        yield held
 
-  def calculate_offset(date, time_, offset):
+  def toykeeper_record(line_id, timestamp, hostmask, text):
+    """Convert the hostmask and text of a line, without its newline, into a 
+    record, or return None for a line of no known type.
+
+    The line is classified on the brackets around its hostmask through 
+    hostmask_parsers, and server lines, whose hostmask is '--', on the words of 
+    their text through event_parsers. The text is split on spaces once at most, 
+    and the parser for its type builds the record from those same words."""
+    parser = ToyKeeperConverter.hostmask_parsers.get(hostmask[:1] + hostmask[-1:])
+    if parser:
+      return parser(line_id, timestamp, hostmask, text)
+
+  def toykeeper_privmsg(line_id, timestamp, hostmask, text):
+    """Parse '<nick>\tmessage'."""
+    return (line_id, "PRIVMSG", timestamp, intern(hostmask[1:-1]), text)
+
+  def toykeeper_bracketed(line_id, timestamp, hostmask, text):
+    """Parse '[nick]\tACTION message', any other text is a CTCP."""
+    return (line_id, "ACTION" if text[:6] == "ACTION" else "CTCP", timestamp, intern(hostmask[1:-1]), text)
+
+  def toykeeper_dashed(line_id, timestamp, hostmask, text):
+    """Parse '-nick-\tmessage' notices, the '-dircproxy-' status lines, and the 
+    '--' server lines with event_parsers, any of them that start with 'CTCP' 
+    being CTCPs and those of no known event notices."""
+    if text[:4] == "CTCP":
+      return (line_id, "CTCP", timestamp, intern(hostmask[1:-1]), text)
+    status = ToyKeeperConverter.status_types.get(text)
+    if status and (status == "JOINED" or hostmask == "-dircproxy-"):
+      return (line_id, status, timestamp)
+    if hostmask == "--":
+      words = text.split(" ", 6)
+      if len(words) >= 3 and not (words[0][:1] == "[" and words[0][-1:] == "]"):
+        event_parser = ToyKeeperConverter.event_parsers.get(words[2])
+        record = event_parser(line_id, timestamp, words) if event_parser else None
+        if record:
+          return record
+    return (line_id, "NOTICE", timestamp, intern(hostmask[1:-1]), text)
+
+  def toykeeper_join(line_id, timestamp, words):
+    """Parse 'nick (user@host) joined #channel'."""
+    if words[1][:1] == "(":
+      return (line_id, "JOIN", timestamp, intern(words[0] + "!" + words[1][1:-1]))
+
+  def toykeeper_part(line_id, timestamp, words):
+    """Parse 'nick (user@host) left #channel'."""
+    if words[1][:1] == "(":
+      return (line_id, "PART", timestamp, intern(words[0] + "!" + words[1][1:-1]))
+
+  def toykeeper_kick(line_id, timestamp, words):
+    """Parse 'nick kicked off by kicker (user@host) message'."""
+    if words[1] == "kicked" and len(words) >= 6:
+      return (line_id, "KICK", timestamp, intern(words[0]), intern(words[4]), words[6] if len(words) > 6 else "")
+
+  def toykeeper_changed(line_id, timestamp, words):
+    """Parse 'nick changed mode: modes' and 'nick changed topic: topic'."""
+    line_type = ToyKeeperConverter.changed_types.get(words[2])
+    if words[1] == "changed" and line_type:
+      return (line_id, line_type, timestamp, intern(words[0]), " ".join(words[3:]))
+
+  def toykeeper_changed_by(line_id, timestamp, words):
+    """Parse 'nick (user@host) changed mode: modes' and the same for topics."""
+    line_type = ToyKeeperConverter.changed_types.get(words[3]) if len(words) > 3 else None
+    if words[1][:1] == "(" and line_type:
+      return (line_id, line_type, timestamp, intern(words[0]), " ".join(words[4:]))
+
+  # Parsers by the brackets around the hostmask, for '--' server lines by the 
+  # third word of the text, and the line types of the changes they log. Each 
+  # returns None for a line it can't handle.
+  hostmask_parsers = {"<>":toykeeper_privmsg, "[]":toykeeper_bracketed, "--":toykeeper_dashed}
+  event_parsers = {"joined":toykeeper_join, "left":toykeeper_part, "off":toykeeper_kick,
+                   "mode:":toykeeper_changed, "topic:":toykeeper_changed, "changed":toykeeper_changed_by}
+  changed_types = {"mode:":"SETMODE", "topic:":"TOPIC"}
+  status_types = {"You connected":"CONNECTED", "You disconnected":"DISCONNECTED",
+                  "You joined the channel":"JOINED"}
+
+
+  # Local midnight of each date string seen so far, as an epoch timestamp.
+  date_midnights = {}
+
+  def calculate_offset(date, time_, offset, date_midnights=date_midnights):
     """Take date, time and offset and calculate the final time from UTC.
     Keyword arguments:
       date: A string representing the date in %Y-%m-%d format.
       time: A string representing the time that can be accepted by time2seconds
       offset: A timedelta representing the UTC offset.
+
+    The midnight of each date is only computed once, after that the offset time 
+    and date are found with integer arithmetic alone.
     """
-    timestamp = int(time.mktime(time.strptime(date, "%Y-%m-%d"))) + time2seconds(time_)
+    midnight = date_midnights.get(date)
+    if midnight is None:
+      midnight = date_midnights[date] = int(time.mktime(time.strptime(date, "%Y-%m-%d")))
+    seconds = time2seconds(time_)
     if offset == None:
-      return (time2seconds(time_), int(time.mktime(time.strptime(date, "%Y-%m-%d"))))
-    else:
-      try:  
-        offset_timestamp = timestamp - ((int(offset)) * (60 ** 2))
-      except ValueError:
-        raise ValueError("Offset" + str(offset) + " was not a properly formatted UTC offset.")
-    offset_gmtime = time.gmtime(offset_timestamp)
-    time_ = time2seconds(time.strftime("%H:%M:%S", offset_gmtime))
-    date = offset_gmtime[:3] + (0,0,0) + offset_gmtime[6:9]
-    datestamp = timegm(date)
-    return (time_, datestamp)
-
+      return (seconds, midnight)
+    try:  
+      offset_timestamp = midnight + seconds - ((int(offset)) * (60 ** 2))
+    except ValueError:
+      raise ValueError("Offset" + str(offset) + " was not a properly formatted UTC offset.")
+    (days, time_) = divmod(offset_timestamp, 86400) # UTC days have no leap seconds in epoch time.
+    return (time_, days * 86400)
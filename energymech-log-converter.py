@@ -7,6 +7,7 @@ energymech-log-converter - A utility to convert energymech logs to JSON or SQLit
 usage: energymech-log-converter.py [Logs] [Options]
 
 Convert the logs (file or a directory) to a JSON (default) or SQLite database.
+Logs compressed with gzip, bzip2, xz or zstandard are decompressed on the fly.
 
 ----
 
@@ -14,13 +15,86 @@ Options
 
 -h --help Show this help dialog.
 
--o --output The filepath to write output to, default is standard output.
+-o --output The filepath to write output to, default is standard output. JSON
+output is compressed when the filepath ends in .gz, .bz2, .xz or .zst.
 
 --json Output as a JSON archive.
 
 --sqlite Output as a SQLite database.
 
---format Convert log as <FORMAT>
+--jsonl Output as JSON Lines, one record per line.
+
+--archive Output as a columnar archive indexed by day, which can be read a day
+at a time with utilities.archive.ArchiveReader.
+
+--format Convert log as <FORMAT>, energymech or toykeeper. When it is left out
+the format is worked out from the first lines of the log.
+
+-c --channel Name of the channel the logs are from, for SQLite output.
+
+-n --network Name of the network the channel is on, for SQLite output.
+
+-m --manifest Convert incrementally, only appending files that are new or changed
+since the last run recorded in <MANIFEST>. A file that was changed other than by
+appending to it is rejected.
+
+-j --jobs Parse log files with <N> worker processes.
+
+--bulk Load SQLite output in bulk, staging the raw lines and resolving them
+into the schema with set based INSERT ... SELECT statements at the end. This is
+slower than the default load, which looks ids up in memory as it goes.
+
+--fts Build a full text index of the message, part, quit, kick and topic text
+in SQLite output. Appending to a database that has one keeps it up to date,
+and adding one to a database that has none indexes the messages already there.
+
+-s --search Search the full text index of the SQLite database given with
+--output, printing the most recent --limit matches (50 by default) with their
+date, channel and nick, e.g. --search '"release notes" OR changelog'.
+
+--since, --until Only convert lines logged from one date to another, inclusive,
+given as YYYY-MM-DD. Energymech files outside the dates are never opened, and
+in an uncompressed ToyKeeper log the first date is found by bisecting the file.
+
+--types Only keep lines of the given types, e.g. PRIVMSG ACTION.
+
+--follow Keep running, converting the lines appended to the newest log file
+(for energymech, moving on to each new day's file as it is created) every
+--interval seconds (1 by default) until interrupted. Only jsonl and sqlite
+output can be followed.
+
+--state Save the file, offset and line id --follow has got to in <STATE>, so
+that following again later carries on from there.
+
+--cache Keep the records parsed from each log file in the directory <CACHE>,
+keyed by the file's path and content and the converter, so converting the same
+logs again, to another output format or after a crash, loads them instead of
+parsing them. The least recently used are removed once the cache is larger than
+--cache-size megabytes (1024 by default).
+
+-p --pipeline Read the logs ahead in one thread and write the output in another
+while parsing, so slow or compressed input and slow output overlap with it.
+
+-b --batch Treat the logs as a glob of channel directories and files, or a JSON
+file listing them each with a "logs" path and optional "format", "channel" and
+"network", converting the channels in parallel with --jobs worker processes,
+largest first. SQLite output is merged into the one --output database, other
+formats are written to a file per channel in the --output directory.
+
+--daily-stats Count the lines of each type, the messages of each nick and
+the lines in each hour of every day as it is converted, writing them to
+<DAILY_STATS> as JSON if it ends in .json, otherwise to daily_types,
+daily_nicks and daily_hours tables of a SQLite database, which may be the
+--output database. Appending to the output adds to the counts already there.
+
+--stats Print the time taken by each stage of the conversion, the number of
+records of each type, unparsed lines and bytes in and out to standard error
+when done, as text or, with --stats json, as JSON.
+
+--profile Profile the conversion with cProfile, dumping the results to <PROFILE>.
+
+--per-channel In batch mode write a SQLite database per channel to the --output
+directory instead.
 
 """
 
@@ -28,11 +102,18 @@ import sys
 
 import argparse
 
-import json
+import datetime
+
+import os
+
+import converters
+
+from utilities.compression import open_log
 
-import sqlite3
+from utilities.symbols import SymbolTable, normalise_nick, split_hostmask, split_userhost
 
-import importlib
+# Anything else, sqlite3 and json included, is imported where it is used, so a
+# run only pays for importing what its formats and options need.
 
 
 class BufferedOutputHandler():
@@ -47,7 +128,16 @@ class BufferedOutputHandler():
         pass
         
     def write_day(self,day):
-        """Writes a single days worth of logs to the output."""
+        """Writes a single days worth of logs to the output.
+
+        The lines of the day may be any iterable, including a generator that
+        reads them from disk as it goes, so implementations should consume
+        them exactly once and avoid holding the whole day in memory."""
+        pass
+
+    def flush(self):
+        """Makes everything written so far visible to readers of the output,
+        called by --follow after each batch of new lines."""
         pass
 
     def close(self):
@@ -56,16 +146,51 @@ class BufferedOutputHandler():
 
 
 class BufferedSqliteOutputHandler(BufferedOutputHandler):
-    """ To be implemented.. """
-    
-    def __init__(self, filepath):
-        self.conn = sqlite3.connect(filepath)
+    """ Implements buffered output of logs to a normalised SQLite database.
+
+        Each day is inserted in a single transaction with executemany, the ids
+        of nicks, users, hosts and hostmasks are cached in memory so a line
+        never needs a SELECT, and indexes are only built once loading is done.
+
+        Loading is not synced to disk until the handler is closed, unless it is
+        being followed, which never closes it. """
 
-    def _create_table(cur, table_def):
-        self.cur.execute("CREATE TABLE IF NOT EXISTS {}")
+    # Rows buffered before they are flushed to the database within a day's transaction.
+    batch_size = 50000
+
+    # The table holding the text of each message type, keyed on its row in messages.
+    message_tables = {"PRIVMSG":"privmsgs", "ACTION":"actions", "NOTICE":"notices",
+                      "CTCP":"ctcps"}
+
+    indexes = ("messages_timestamp ON messages(timestamp)",
+               "messages_channel ON messages(channel)",
+               "messages_type ON messages(type)",
+               "privmsgs_nid ON privmsgs(nid)",
+               "actions_nid ON actions(nid)",
+               "notices_nid ON notices(nid)",
+               "hostmasks_nid ON hostmasks(nid)")
+
+    def __init__(self, filepath, channel=None, network=None, fts=False, follow=False):
+        import sqlite3
+        # The connection may be handed to a writer thread by --pipeline, it is
+        # only ever used from one thread at a time.
+        self.conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.channel = channel
+        self.network = network
+        self.fts = fts
+        self.follow = follow
+
+    def _create_table(self, table_def):
+        self.cur.execute("CREATE TABLE IF NOT EXISTS {}".format(table_def))
 
     def begin(self):
+        import sqlite3
         self.cur = self.conn.cursor()
+        # Bulk load settings, durability is restored when the handler is closed.
+        # A followed database is written to until interrupted, so it is synced
+        # as it goes instead, which with WAL keeps it intact through a crash.
+        self.cur.execute("PRAGMA journal_mode = WAL;")
+        self.cur.execute("PRAGMA synchronous = NORMAL;" if self.follow else "PRAGMA synchronous = OFF;")
         self.cur.execute("PRAGMA foreign_keys = ON;")
         
         # If two things are equivalent then they determine the same things.
@@ -105,7 +230,7 @@ class BufferedSqliteOutputHandler(BufferedOutputHandler):
                           " FOREIGN KEY(mid) REFERENCES messages(id), FOREIGN"
                           " KEY(nid) REFERENCES nicks(id))")
  
-        self.create_table("actions(mid INTEGER PRIMARY KEY, nid INTEGER, message TEXT,"
+        self._create_table("actions(mid INTEGER PRIMARY KEY, nid INTEGER, message TEXT,"
                           " FOREIGN KEY(mid) REFERENCES messages(id), FOREIGN"
                           " KEY(nid) REFERENCES nicks(id))")
 
@@ -147,14 +272,111 @@ class BufferedSqliteOutputHandler(BufferedOutputHandler):
                           " topic TEXT, FOREIGN KEY(mid) REFERENCES messages(id),"
                           " FOREIGN KEY(nid_set_by) REFERENCES nicks(id))")
 
+        self._create_table("ctcps(mid INTEGER PRIMARY KEY, nid INTEGER, message TEXT,"
+                          " FOREIGN KEY(mid) REFERENCES messages(id), FOREIGN"
+                          " KEY(nid) REFERENCES nicks(id))")
+        self.conn.commit()
+
+        # The text of every message that has any, with the nick it came from.
+        self.cur.execute("CREATE VIEW IF NOT EXISTS message_lines(mid, nid, text) AS"
+                         " SELECT mid, nid, message FROM privmsgs UNION ALL"
+                         " SELECT mid, nid, message FROM actions UNION ALL"
+                         " SELECT mid, nid, message FROM notices UNION ALL"
+                         " SELECT mid, nid, message FROM ctcps UNION ALL"
+                         " SELECT mid, hostmasks.nid, part_message FROM parts JOIN hostmasks ON hostmasks.id = parts.hostmask UNION ALL"
+                         " SELECT mid, hostmasks.nid, quit_message FROM quits JOIN hostmasks ON hostmasks.id = quits.hostmask UNION ALL"
+                         " SELECT mid, nid_kicked_by, kick_message FROM kicks UNION ALL"
+                         " SELECT mid, nid_set_by, topic FROM set_topic")
+        self.indexed = bool(self.cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'message_text'").fetchone())
+        # A new index is filled with the messages already in the database too, an
+        # existing one already holds them.
+        backfill = self.fts and not self.indexed
+        if backfill:
+            try:
+                self.cur.execute("CREATE VIRTUAL TABLE message_text USING fts5(text, content='')")
+            except sqlite3.OperationalError:
+                raise ValueError("The full text index needs a SQLite built with FTS5.")
+            self.indexed = True
+
+        self._load_ids()
+        self.first_mid = 1 if backfill else self.next_ids["messages"]
+        self.chid = self._channel_id(self.channel, self.network)
+        self.conn.commit()
+
+    def _load_ids(self):
+        """Read the ids already in the database so appending to it reuses them."""
+        self.symbols = {"nicks":SymbolTable(normalise_nick), "users":SymbolTable(str),
+                        "client_hosts":SymbolTable(), "msg_types":SymbolTable(str)}
+        for table, column in (("nicks", "nickname"), ("users", "username"),
+                              ("client_hosts", "hostname"), ("msg_types", "type")):
+            self.symbols[table].load(self.cur.execute("SELECT id, {} FROM {}".format(column, table)))
+        self.hostmask_ids = dict(((nwid, nid, uid, hid), id_) for (id_, nwid, nid, uid, hid) in
+                                 self.cur.execute("SELECT id, nwid, nid, uid, hid FROM hostmasks"))
+        self.raw_hostmask_ids = {}
+        self.next_ids = {}
+        for table in ("hostmasks", "messages"):
+            self.next_ids[table] = self.cur.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM {}".format(table)).fetchone()[0]
+        self.nwid = None
+
+    def _network_id(self, network):
+        """Find or create the rows for a network, returning its id."""
+        if not network:
+            return None
+        network = network.lower()
+        row = self.cur.execute("SELECT nwid FROM networks WHERE nw_name = ?", (network,)).fetchone()
+        if row:
+            return row[0]
+        self.cur.execute("INSERT OR IGNORE INTO servers(hostname) VALUES (?)", (network,))
+        server = self.cur.execute("SELECT id FROM servers WHERE hostname = ?", (network,)).fetchone()[0]
+        self.cur.execute("INSERT INTO networks(server, nwid, nw_name) VALUES (?, ?, ?)",
+                         (server, server, network))
+        return server
+
+    def _channel_id(self, channel, network):
+        """Find or create the rows for a channel and its network, returning the channel id."""
+        self.nwid = self._network_id(network)
+        if not channel:
+            return None
+        channel = channel.lower()
+        row = self.cur.execute("SELECT id FROM channels WHERE channel = ? AND nwid IS ?",
+                               (channel, self.nwid)).fetchone()
+        if row:
+            return row[0]
+        return self.cur.execute("INSERT INTO channels(nwid, channel) VALUES (?, ?)", (self.nwid, channel)).lastrowid
+
+    def _hostmask_id(self, nick, userhost):
+        """Return the id of the hostmask made of a nick and a [~]user@host string."""
+        id_ = self.raw_hostmask_ids.get((nick, userhost))
+        if id_ is None:
+            (user, host) = split_userhost(userhost)
+            id_ = self._hostmask_key_id((self.nwid, self.symbols["nicks"].id(nick), self.symbols["users"].id(user),
+                                         self.symbols["client_hosts"].id(host)))
+            self.raw_hostmask_ids[(nick, userhost)] = id_
+        return id_
+
+    def _hostmask_key_id(self, key):
+        """Return the id of the hostmask with the (nwid, nid, uid, hid) key, queueing a new row if it is unseen."""
+        id_ = self.hostmask_ids.get(key)
+        if id_ is None:
+            id_ = self.hostmask_ids[key] = self.next_ids["hostmasks"]
+            self.next_ids["hostmasks"] += 1
+            self.pending["hostmasks"].append((id_,) + key)
+        return id_
+
+    def _full_hostmask_id(self, hostmask):
+        """Return the id of a hostmask given as a single nick!user@host string."""
+        (nick, _, userhost) = hostmask.partition("!")
+        return self._hostmask_id(nick, userhost)
+
     def write_day(self, day):
         """
         Accepts a day dictionary with predefined attributes.
         
         Keyword Arguments:
             day:
-                A list with dictionaries of different contents depending on its
-                "type" attribute.
+                A dict mapping the timestamp of the day to an iterable of lines.
+                Each line is a sequence of different contents depending on its
+                "type" attribute, the channel is given to the handler itself.
 
                 Types:
                 
@@ -236,20 +458,309 @@ class BufferedSqliteOutputHandler(BufferedOutputHandler):
                     - Channel Names
                     - Hosts in hostmasks 
         """
-        cur = self.conn.cursor()
-        date = day.keys()[0]
-        messages = day[date]
-        for message in messages:
-            line_id = message[0]
-            line_type = message[1]
-            time = message[2]
-            
+        for date, lines in day.items():
+            self._reset_pending()
+            with self.conn:
+                for line in lines:
+                    self.insert(date, line)
+                    if len(self.pending["messages"]) >= self.batch_size:
+                        self._flush()
+                self._flush()
 
     def close(self):
+        """ Build the indexes now the data is loaded and restore durability. """
+        for index in self.indexes:
+            self.cur.execute("CREATE INDEX IF NOT EXISTS " + index)
+        self._index_text()
+        if self.indexed:
+            self.cur.execute("INSERT INTO message_text(message_text) VALUES ('optimize')")
+        self.conn.commit()
+        self.cur.execute("PRAGMA synchronous = FULL;")
         self.conn.close()
 
-    def insert(self, table, params):
-        
+    def flush(self):
+        """ Index the text of the days written so far, which are already committed. """
+        self._index_text()
+        self.conn.commit()
+
+    def _index_text(self):
+        """ Add the text of the messages loaded since the last call to the full
+            text index, if the database has one, so appending keeps it up to date. """
+        if not self.indexed:
+            return
+        self.cur.execute("INSERT INTO message_text(rowid, text) SELECT mid, text FROM message_lines"
+                         " WHERE mid >= ? AND text IS NOT NULL", (self.first_mid,))
+        self.first_mid = self.next_ids["messages"]
+
+    def insert(self, date, line):
+        """ Queue the rows representing a single line for insertion. """
+        (line_type, mid) = (line[1], self.next_ids["messages"])
+        self.next_ids["messages"] += 1
+        (pending, nick_id) = (self.pending, self.symbols["nicks"].id)
+        pending["messages"].append((mid, date + line[2], self.chid, self.symbols["msg_types"].id(line_type)))
+        if line_type in self.message_tables:
+            pending[self.message_tables[line_type]].append((mid, nick_id(line[3]), line[4]))
+        elif line_type == "JOIN":
+            if len(line) == 4:
+                pending["joins"].append((mid, self._full_hostmask_id(line[3])))
+            else:
+                pending["joins"].append((mid, self._hostmask_id(line[3], line[4])))
+        elif line_type == "PART" or line_type == "QUIT":
+            table = "parts" if line_type == "PART" else "quits"
+            if len(line) == 4:
+                pending[table].append((mid, self._full_hostmask_id(line[3]), None))
+            else:
+                pending[table].append((mid, self._hostmask_id(line[3], line[4]), line[5]))
+        elif line_type == "KICK":
+            pending["kicks"].append((mid, nick_id(line[3]), nick_id(line[4]), line[5]))
+        elif line_type == "NICK":
+            pending["nick_changes"].append((mid, nick_id(line[3]), nick_id(line[4])))
+        elif line_type == "SETMODE":
+            pending["set_modes"].append((mid, nick_id(line[3]), line[4]))
+        elif line_type == "TOPIC":
+            pending["set_topic"].append((mid, nick_id(line[3]), line[4]))
+
+    # Tables in the order their rows must be inserted to satisfy foreign keys.
+    insert_statements = (("nicks", "INSERT INTO nicks(id, nickname) VALUES (?, ?)"),
+                         ("users", "INSERT INTO users(id, username) VALUES (?, ?)"),
+                         ("client_hosts", "INSERT INTO client_hosts(id, hostname) VALUES (?, ?)"),
+                         ("msg_types", "INSERT INTO msg_types(id, type) VALUES (?, ?)"),
+                         ("hostmasks", "INSERT INTO hostmasks(id, nwid, nid, uid, hid) VALUES (?, ?, ?, ?, ?)"),
+                         ("messages", "INSERT INTO messages(id, timestamp, channel, type) VALUES (?, ?, ?, ?)"),
+                         ("privmsgs", "INSERT INTO privmsgs(mid, nid, message) VALUES (?, ?, ?)"),
+                         ("actions", "INSERT INTO actions(mid, nid, message) VALUES (?, ?, ?)"),
+                         ("notices", "INSERT INTO notices(mid, nid, message) VALUES (?, ?, ?)"),
+                         ("ctcps", "INSERT INTO ctcps(mid, nid, message) VALUES (?, ?, ?)"),
+                         ("joins", "INSERT INTO joins(mid, hostmask) VALUES (?, ?)"),
+                         ("parts", "INSERT INTO parts(mid, hostmask, part_message) VALUES (?, ?, ?)"),
+                         ("quits", "INSERT INTO quits(mid, hostmask, quit_message) VALUES (?, ?, ?)"),
+                         ("kicks", "INSERT INTO kicks(mid, nid_kicked, nid_kicked_by, kick_message) VALUES (?, ?, ?, ?)"),
+                         ("nick_changes", "INSERT INTO nick_changes(mid, nid_before, nid_after) VALUES (?, ?, ?)"),
+                         ("set_modes", "INSERT INTO set_modes(mid, nid_set_by, mode_string) VALUES (?, ?, ?)"),
+                         ("set_topic", "INSERT INTO set_topic(mid, nid_set_by, topic) VALUES (?, ?, ?)"))
+
+    def _reset_pending(self):
+        self.pending = dict((table, []) for (table, statement) in self.insert_statements)
+
+    def _flush(self):
+        """ Write every queued row with one executemany per table. """
+        for (table, symbols) in self.symbols.items():
+            self.pending[table].extend(symbols.take_new())
+        for (table, statement) in self.insert_statements:
+            rows = self.pending[table]
+            if rows:
+                self.cur.executemany(statement, rows)
+                del rows[:]
+
+
+    # Columns of the message tables holding the id of a row in another table,
+    # which has to be renumbered when databases are merged.
+    reference_columns = {"nid":"nicks", "nid_kicked":"nicks", "nid_kicked_by":"nicks",
+                         "nid_before":"nicks", "nid_after":"nicks", "nid_set_by":"nicks",
+                         "hostmask":"hostmasks"}
+
+    def merge(self, filepath):
+        """ Append the contents of another database written by this handler.
+
+            Nicks, hosts, hostmasks and channels are matched to those already
+            here or given new ids, then messages are copied across with one
+            INSERT ... SELECT per table, renumbered through a temporary map. """
+        self.cur.execute("ATTACH DATABASE ? AS part", (filepath,))
+        self._reset_pending()
+        with self.conn:
+            id_maps = {}
+            for table, column in (("nicks", "nickname"), ("users", "username"),
+                                  ("client_hosts", "hostname"), ("msg_types", "type")):
+                rows = self.cur.execute("SELECT id, {} FROM part.{}".format(column, table)).fetchall()
+                id_maps[table] = dict((id_, self.symbols[table].id(value)) for (id_, value) in rows)
+            networks = dict((nwid, self._network_id(nw_name)) for (nwid, nw_name) in
+                            self.cur.execute("SELECT nwid, nw_name FROM part.networks").fetchall())
+            channels = self.cur.execute("SELECT channels.id, channel, nw_name FROM part.channels LEFT JOIN"
+                                        " part.networks ON networks.nwid = channels.nwid").fetchall()
+            id_maps["channels"] = dict((id_, self._channel_id(channel, nw_name)) for (id_, channel, nw_name) in channels)
+            hostmasks = self.cur.execute("SELECT id, nwid, nid, uid, hid FROM part.hostmasks").fetchall()
+            id_maps["hostmasks"] = dict((id_, self._hostmask_key_id((networks.get(nwid), id_maps["nicks"][nid],
+                                                                     id_maps["users"][uid], id_maps["client_hosts"][hid])))
+                                        for (id_, nwid, nid, uid, hid) in hostmasks)
+            self._flush()
+
+            self.cur.execute("CREATE TEMP TABLE IF NOT EXISTS id_map(kind TEXT, old INTEGER, new INTEGER,"
+                             " PRIMARY KEY (kind, old)) WITHOUT ROWID")
+            self.cur.execute("DELETE FROM id_map")
+            for kind, id_map in id_maps.items():
+                self.cur.executemany("INSERT INTO id_map(kind, old, new) VALUES (?, ?, ?)",
+                                     ((kind, old, new) for (old, new) in id_map.items()))
+            offset = self.next_ids["messages"] - 1
+            self.cur.execute("INSERT INTO messages(id, timestamp, channel, type) SELECT messages.id + ?,"
+                             " timestamp, channels.new, types.new FROM part.messages LEFT JOIN id_map channels"
+                             " ON channels.kind = 'channels' AND channels.old = messages.channel LEFT JOIN"
+                             " id_map types ON types.kind = 'msg_types' AND types.old = messages.type"
+                             " ORDER BY messages.id", (offset,))
+            self.next_ids["messages"] = self.cur.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM messages").fetchone()[0]
+
+            tables = [table for (table, statement) in self.insert_statements]
+            for table in tables[tables.index("messages") + 1:]:
+                columns = [row[1] for row in self.cur.execute("PRAGMA part.table_info({})".format(table))]
+                (select, joins) = ([], [])
+                for column in columns:
+                    if column == "mid":
+                        select.append("part_table.mid + :offset")
+                    elif column in self.reference_columns:
+                        select.append(column + ".new")
+                        joins.append(" LEFT JOIN id_map {0} ON {0}.kind = '{1}' AND {0}.old = part_table.{0}".format(
+                            column, self.reference_columns[column]))
+                    else:
+                        select.append("part_table." + column)
+                self.cur.execute("INSERT INTO {0}({1}) SELECT {2} FROM part.{0} part_table{3}".format(
+                    table, ", ".join(columns), ", ".join(select), "".join(joins)), {"offset":offset})
+        self.cur.execute("DETACH DATABASE part")
+
+class BufferedSqliteBulkOutputHandler(BufferedSqliteOutputHandler):
+    """ Implements bulk loading of logs into the same SQLite schema.
+
+        Lines are appended as raw values to an unindexed temporary staging
+        table, with no ids looked up along the way, only the few distinct nicks,
+        hosts and types are remembered. Once every line is in, those fill the
+        lookup tables and the messages are resolved against them with one set
+        based INSERT ... SELECT per table, with foreign key checks replaced by a
+        check of the new rows for ids that did not resolve, and the indexes are
+        built last.
+
+        This is slower than the default row at a time load, which looks its ids
+        up in memory rather than joining for them. """
+
+    def begin(self):
+        BufferedSqliteOutputHandler.begin(self)
+        self.first_staged = self.next_ids["messages"]
+        self.cur.execute("CREATE TEMP TABLE staging(mid INTEGER PRIMARY KEY, timestamp INTEGER, type TEXT,"
+                         " nick TEXT, other TEXT, user TEXT, host TEXT, text TEXT)")
+        # Distinct values seen while staging, in order of first appearance, so
+        # the lookup tables can be filled without scanning the staged lines.
+        (self.nick_keys, self.types, self.userhosts) = ({}, {}, {})
+        self.conn.commit()
+
+    def write_day(self, day):
+        """ Stages the lines of a day, see BufferedSqliteOutputHandler.write_day. """
+        for date, lines in day.items():
+            with self.conn:
+                rows = []
+                for line in lines:
+                    rows.append(self.stage(date, line))
+                    if len(rows) >= self.batch_size:
+                        self.cur.executemany("INSERT INTO staging VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                        rows = []
+                self.cur.executemany("INSERT INTO staging VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def nick_key(self, nick):
+        """ Return the normalised form of a nick, as the nicks table holds it. """
+        key = self.nick_keys.get(nick)
+        if key is None:
+            key = self.nick_keys[nick] = normalise_nick(nick)
+        return key
+
+    def stage(self, date, line):
+        """ Return the staging row for a line:
+            (mid, timestamp, type, nick, other nick, user, host, text). """
+        (line_type, mid) = (line[1], self.next_ids["messages"])
+        self.next_ids["messages"] += 1
+        self.types[line_type] = None
+        timestamp = date + line[2]
+        if line_type in self.message_tables or line_type == "SETMODE" or line_type == "TOPIC":
+            return (mid, timestamp, line_type, self.nick_key(line[3]), None, None, None, line[4])
+        elif line_type == "JOIN" or line_type == "PART" or line_type == "QUIT":
+            if len(line) == 4:
+                (nick, user, host) = split_hostmask(line[3])
+            else:
+                (nick, (user, host)) = (line[3], split_userhost(line[4]))
+            (nick, host, text) = (self.nick_key(nick), host.lower(), line[5] if len(line) > 5 else None)
+            self.userhosts[(nick, user, host)] = None
+            return (mid, timestamp, line_type, nick, None, user, host, text)
+        elif line_type == "KICK":
+            return (mid, timestamp, line_type, self.nick_key(line[3]), self.nick_key(line[4]), None, None, line[5])
+        elif line_type == "NICK":
+            return (mid, timestamp, line_type, self.nick_key(line[3]), self.nick_key(line[4]), None, None, None)
+        return (mid, timestamp, line_type, None, None, None, None, None)
+
+    # The table each staged type goes to and the columns it fills, from the
+    # staged mid, nick, other nick, hostmask and text.
+    staged_tables = (("PRIVMSG", "privmsgs(mid, nid, message)", "mid, nick, text"),
+                     ("ACTION", "actions(mid, nid, message)", "mid, nick, text"),
+                     ("NOTICE", "notices(mid, nid, message)", "mid, nick, text"),
+                     ("CTCP", "ctcps(mid, nid, message)", "mid, nick, text"),
+                     ("JOIN", "joins(mid, hostmask)", "mid, hostmask"),
+                     ("PART", "parts(mid, hostmask, part_message)", "mid, hostmask, text"),
+                     ("QUIT", "quits(mid, hostmask, quit_message)", "mid, hostmask, text"),
+                     ("KICK", "kicks(mid, nid_kicked, nid_kicked_by, kick_message)", "mid, nick, other, text"),
+                     ("NICK", "nick_changes(mid, nid_before, nid_after)", "mid, nick, other"),
+                     ("SETMODE", "set_modes(mid, nid_set_by, mode_string)", "mid, nick, text"),
+                     ("TOPIC", "set_topic(mid, nid_set_by, topic)", "mid, nick, text"))
+
+    # The joins each staged column needs to be resolved to its id.
+    staged_columns = {"mid":("staging.mid", ""),
+                      "text":("staging.text", ""),
+                      "nick":("nicks.id", " LEFT JOIN nicks ON nicks.nickname = staging.nick"),
+                      "other":("others.id", " LEFT JOIN nicks others ON others.nickname = staging.other"),
+                      "hostmask":("hostmasks.id", " LEFT JOIN nicks ON nicks.nickname = staging.nick"
+                                  " LEFT JOIN users ON users.username = staging.user"
+                                  " LEFT JOIN client_hosts ON client_hosts.hostname = staging.host"
+                                  " LEFT JOIN hostmasks ON hostmasks.nwid IS :nwid AND hostmasks.nid = nicks.id"
+                                  " AND hostmasks.uid = users.id AND hostmasks.hid = client_hosts.id")}
+
+    def resolve(self):
+        """ Move the staged lines into the schema with set based statements. """
+        parameters = {"nwid":self.nwid, "chid":self.chid}
+        self.cur.execute("PRAGMA foreign_keys = OFF;")
+        with self.conn:
+            self.cur.executemany("INSERT OR IGNORE INTO msg_types(type) VALUES (?)",
+                                 ((line_type,) for line_type in self.types))
+            self.cur.executemany("INSERT OR IGNORE INTO nicks(nickname) VALUES (?)",
+                                 ((nick,) for nick in dict.fromkeys(self.nick_keys.values())))
+            self.cur.executemany("INSERT OR IGNORE INTO users(username) VALUES (?)",
+                                 ((user,) for user in dict.fromkeys(user for (nick, user, host) in self.userhosts)))
+            self.cur.executemany("INSERT OR IGNORE INTO client_hosts(hostname) VALUES (?)",
+                                 ((host,) for host in dict.fromkeys(host for (nick, user, host) in self.userhosts)))
+            self.cur.executemany("INSERT INTO hostmasks(nwid, nid, uid, hid) SELECT :nwid, nicks.id, users.id,"
+                                 " client_hosts.id FROM nicks, users, client_hosts WHERE nicks.nickname = :nick"
+                                 " AND users.username = :user AND client_hosts.hostname = :host AND NOT EXISTS"
+                                 " (SELECT 1 FROM hostmasks WHERE nwid IS :nwid AND nid = nicks.id AND"
+                                 " uid = users.id AND hid = client_hosts.id)",
+                                 (dict(parameters, nick=nick, user=user, host=host)
+                                  for (nick, user, host) in self.userhosts))
+            self.cur.execute("INSERT INTO messages(id, timestamp, channel, type) SELECT mid, timestamp, :chid,"
+                             " msg_types.id FROM staging JOIN msg_types ON msg_types.type = staging.type"
+                             " ORDER BY mid", parameters)
+            for (line_type, table, columns) in self.staged_tables:
+                columns = [self.staged_columns[column] for column in columns.split(", ")]
+                self.cur.execute("INSERT INTO {} SELECT {} FROM staging{} WHERE staging.type = :type"
+                                 " ORDER BY staging.mid".format(table, ", ".join(select for (select, join) in columns),
+                                                                "".join(join for (select, join) in columns)),
+                                 dict(parameters, type=line_type))
+            unresolved = self.unresolved()
+            if unresolved:
+                raise ValueError("Bulk load could not resolve {} rows, e.g. {}".format(len(unresolved), unresolved[0]))
+            self.cur.execute("DELETE FROM staging")
+        self.cur.execute("PRAGMA foreign_keys = ON;")
+
+    def unresolved(self):
+        """ Return (table, mid) for each row resolved from staging with an id
+            missing. A staged value that matches nothing becomes NULL through its
+            LEFT JOIN, which SQLite does not count as a broken foreign key, so only
+            the new rows, from the first staged mid, are read for NULL ids. """
+        first = self.first_staged
+        unresolved = [("messages", mid) for (mid,) in self.cur.execute(
+            "SELECT mid FROM staging WHERE mid NOT IN (SELECT id FROM messages WHERE id >= ?)", (first,))]
+        for (line_type, table, columns) in self.staged_tables:
+            (name, targets) = table[:-1].split("(")
+            ids = [target for (target, column) in zip(targets.split(", "), columns.split(", "))
+                   if column in ("nick", "other", "hostmask")]
+            unresolved.extend((name, mid) for (mid,) in self.cur.execute(
+                "SELECT mid FROM {} WHERE mid >= ? AND ({} IS NULL)".format(name, " IS NULL OR ".join(ids)), (first,)))
+        return unresolved
+
+    def close(self):
+        """ Resolve the staged lines, then build the indexes and restore durability. """
+        self.resolve()
+        BufferedSqliteOutputHandler.close(self)
 
 class BufferedJSONOutputHandler(BufferedOutputHandler):
     """ Implements buffered output to JSON of logs being read. """
@@ -258,11 +769,13 @@ class BufferedJSONOutputHandler(BufferedOutputHandler):
         """ Configure the class with output format, path, etc.
                 Should probably refactor so that format is handled by subclasses
                 implementing this interface rather than internal logic. """
+        import json
         if isinstance(filepath,str):
-            self.outfile = open(filepath,'w',encoding='utf-8')
+            self.outfile = open_log(filepath,'w',encoding='utf-8')
         else:
             self.outfile = filepath
         self.prevday = False
+        self.dumps = json.dumps
         
     def begin(self):
         """ Handle any initial writes. """
@@ -272,14 +785,18 @@ class BufferedJSONOutputHandler(BufferedOutputHandler):
         """ Writes a day's entry.
 
         Arguments:
-            day: a dict (usually of one entry) which has a 'datestring':array_of_lines format. """
-        #strip the object braces.
-        outstr = json.dumps(day,indent=2)[2:-2]
-        if self.prevday:
-            self.outfile.write(',\n')
-        else:
-            self.prevday = True
-        self.outfile.write(outstr)
+            day: a dict (usually of one entry) which has a 'datestring':iterable_of_lines format. """
+        for date, lines in day.items():
+            if self.prevday:
+                self.outfile.write(',\n')
+            else:
+                self.prevday = True
+            self.outfile.write('  ' + self.dumps(str(date)) + ': [')
+            separator = '\n    '
+            for line in lines:
+                self.outfile.write(separator + self.dumps(line))
+                separator = ',\n    '
+            self.outfile.write('\n  ]' if separator != '\n    ' else ']')
 
     def close(self):
         """ Close the log. """
@@ -287,44 +804,308 @@ class BufferedJSONOutputHandler(BufferedOutputHandler):
         self.outfile.close()
 
 
+class BufferedJSONLinesOutputHandler(BufferedOutputHandler):
+    """ Implements streaming output of logs as JSON Lines, one compact record per line.
+
+        Each record is a JSON array of the date timestamp of its day followed by
+        the fields of the line, e.g. [1388534400,0,"PRIVMSG",62,"nick","message"],
+        so the output can be split, streamed and appended to line by line. """
+
+    def __init__(self, filepath, append=False):
+        import json
+        if isinstance(filepath,str):
+            self.outfile = open_log(filepath,'a' if append else 'w',encoding='utf-8')
+        else:
+            self.outfile = filepath
+        self.encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+    def write_day(self,day):
+        """ Writes every line of a day as its own record.
+
+        Arguments:
+            day: a dict (usually of one entry) which has a 'datestring':iterable_of_lines format. """
+        (encode, write) = (self.encode, self.outfile.write)
+        for date, lines in day.items():
+            prefix = '[' + encode(date) + ','
+            for line in lines:
+                write(prefix + encode(line)[1:] + '\n')
+
+    def flush(self):
+        """ Push the records written so far out to the file. """
+        self.outfile.flush()
+
+    def close(self):
+        """ Close the log. """
+        self.outfile.close()
+
+
+class BufferedArchiveOutputHandler(BufferedOutputHandler):
+    """ Implements output to a columnar archive with a block per day and an index
+        of them, which utilities.archive.ArchiveReader can seek straight into. """
+
+    def __init__(self, filepath):
+        from utilities.archive import ArchiveWriter
+        self.archive = ArchiveWriter(filepath)
+
+    def write_day(self,day):
+        """ Writes each day as a block of the archive.
+
+        Arguments:
+            day: a dict (usually of one entry) which has a 'datestring':iterable_of_lines format. """
+        for date, lines in day.items():
+            self.archive.write_day(date, lines)
+
+    def close(self):
+        """ Write the index and close the archive. """
+        self.archive.close()
+
+
 class conversion_wrapper():
     """Wraps the various converters and imports them all into one unified interface."""
 
+    # The output handler for each output format, with the options of
+    # output_handler that it takes. The input formats are registered in the
+    # converters package.
+    supported_formats = {'json':(BufferedJSONOutputHandler, ()),
+                         'jsonl':(BufferedJSONLinesOutputHandler, ('append',)),
+                         'sqlite':(BufferedSqliteOutputHandler, ('channel', 'network', 'fts', 'follow')),
+                         'archive':(BufferedArchiveOutputHandler, ())}
+
+    def converter(format):
+        """Import and return the converter module for a log format."""
+        return converters.load(format)
+
+    def output_handler(oformat, output, bulk=False, **options):
+        """Return the output handler writing oformat to output, passing it those
+        of the channel, network, append and fts options it takes."""
+        (handler, handler_options) = conversion_wrapper.supported_formats[oformat]
+        if bulk and handler is BufferedSqliteOutputHandler:
+            handler = BufferedSqliteBulkOutputHandler
+        return handler(output, **dict((name, value) for (name, value) in options.items() if name in handler_options))
+
+    def convert_job(job):
+        """Convert the logs of a single batch job to its own output, returning the job."""
+        handler = conversion_wrapper.output_handler(job["oformat"], job["output"], channel=job["channel"],
+                                                    network=job["network"], bulk=job["bulk"], fts=job["fts"])
+        conversion_wrapper.converter(job["format"]).convert(job["logs"], handler, cache=job["cache"], **job["filters"])
+        return job
+
+    def filters(arguments):
+        """Return the --since, --until and --types options given, as keyword arguments for convert."""
+        filters = {}
+        if arguments.since:
+            filters["since"] = arguments.since
+        if arguments.until:
+            filters["until"] = arguments.until
+        if arguments.types:
+            filters["types"] = frozenset(line_type.upper() for line_type in arguments.types)
+        return filters
+
+    def batch(arguments, cache=None):
+        """Convert every channel matched by a batch, in a pool of --jobs worker processes.
+
+        For SQLite output each channel is converted to a database of its own in a
+        temporary directory, and these are merged into the --output database as 
+        they complete unless --per-channel is given, otherwise --output is a 
+        directory to write each channel's output to. Every job parses through the
+        one ParseCache cache, if given."""
+        import tempfile
+        from utilities.batch import load_jobs, output_filename, run_jobs
+        jobs = load_jobs(arguments.logs, arguments.format, arguments.channel, arguments.network)
+        for job in jobs:
+            # Channels merged into one database are indexed there, once, rather than each on its own.
+            job.update(filters=conversion_wrapper.filters(arguments), cache=cache, bulk=arguments.bulk,
+                       fts=arguments.fts and (arguments.oformat != 'sqlite' or arguments.per_channel))
+        if arguments.oformat != 'sqlite' or arguments.per_channel:
+            os.makedirs(arguments.output, exist_ok=True)
+            for job in jobs:
+                job.update(oformat=arguments.oformat,
+                           output=os.path.join(arguments.output, output_filename(job, arguments.oformat)))
+            for job in run_jobs(jobs, conversion_wrapper.convert_job, arguments.jobs):
+                pass
+            return
+
+        output_handler = BufferedSqliteOutputHandler(arguments.output, fts=arguments.fts)
+        output_handler.begin()
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(arguments.output))) as directory:
+            for job in jobs:
+                job.update(oformat='sqlite', output=os.path.join(directory, output_filename(job, 'sqlite')))
+            for job in run_jobs(jobs, conversion_wrapper.convert_job, arguments.jobs):
+                output_handler.merge(job["output"])
+                os.remove(job["output"])
+        output_handler.close()
+
     def main():
         """Implement command line interface and call subroutines to handle conversions."""
 
-        supported_formats = {'json':BufferedJSONOutputHandler,
-                                   'sqlite': BufferedSqliteOutputHandler}
+        supported_formats = conversion_wrapper.supported_formats
 
         parser = argparse.ArgumentParser()
-        parser.add_argument("logs", help="The logfile or the directory in which the log files reside.")
+        parser.add_argument("logs", nargs="?", help="The logfile or the directory in which the log files reside.")
         parser.add_argument("--output", "-o", help="Filepath to store output at, default is standard output.")
-        formats_help = """\n\nValid formats are:\n\n\tjson\n\tsqlite"""
+        formats_help = "\n\nValid formats are:\n\n" + "".join("\t" + oformat + "\n" for oformat in supported_formats)
         parser.add_argument("--oformat", help="The format to output." + formats_help)
         parser.add_argument("--timezone", "-t", help="Specify the timezone as a UTC offset. (Not implemented.)")
-        parser.add_argument("--format", "-f", help="Convert log as <FORMAT>.")
+        parser.add_argument("--format", "-f", help="Convert log as <FORMAT>, by default worked out from the first lines"
+                            " of the log. Valid formats are: " + ", ".join(converters.formats) + ".")
+        parser.add_argument("--channel", "-c", help="The name of the channel the logs are from, stored in SQLite output.")
+        parser.add_argument("--network", "-n", help="The name of the network the channel is on, stored in SQLite output.")
+        parser.add_argument("--manifest", "-m", help="Convert incrementally, recording processed files in the manifest at <MANIFEST>"
+                            " and appending only new or changed ones to the output. Files changed other than by"
+                            " appending to them are rejected.")
+        parser.add_argument("--jobs", "-j", type=int, default=1, help="Number of worker processes to parse log files with.")
+        parser.add_argument("--since", type=datetime.date.fromisoformat, help="Only convert lines logged on or after"
+                            " the date <SINCE>, given as YYYY-MM-DD.")
+        parser.add_argument("--until", type=datetime.date.fromisoformat, help="Only convert lines logged on or before"
+                            " the date <UNTIL>, given as YYYY-MM-DD.")
+        parser.add_argument("--types", nargs="+", help="Only keep lines of these types, e.g. --types PRIVMSG ACTION.")
+        parser.add_argument("--bulk", action="store_true", help="Load SQLite output through a staging table resolved"
+                            " with set based inserts at the end, rather than a row at a time. This is slower than"
+                            " the default load.")
+        parser.add_argument("--fts", action="store_true", help="Build a full text index of the message text in SQLite"
+                            " output, for --search.")
+        parser.add_argument("--search", "-s", help="Search the full text index of the SQLite database given with --output"
+                            " for <SEARCH>, an FTS5 query, printing the matching lines.")
+        parser.add_argument("--limit", type=int, default=50, help="The number of most recent matches --search prints.")
+        parser.add_argument("--follow", action="store_true", help="Keep converting lines as they are appended to the"
+                            " newest log file, until interrupted.")
+        parser.add_argument("--state", help="Save how far --follow has got in <STATE>, and carry on from it.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds --follow waits between checks for"
+                            " new lines.")
+        parser.add_argument("--cache", help="Cache the records parsed from each log file in the directory <CACHE>,"
+                            " so converting the same logs again loads them instead of parsing them.")
+        parser.add_argument("--cache-size", type=int, default=1024, help="Megabytes the --cache directory is kept"
+                            " within, removing the least recently used entries.")
+        parser.add_argument("--pipeline", "-p", action="store_true", help="Read ahead and write behind in threads so"
+                            " input, parsing and output overlap.")
+        parser.add_argument("--batch", "-b", action="store_true", help="Treat logs as a glob of channel directories and files,"
+                            " or a JSON file listing them, and convert each as a channel of its own.")
+        parser.add_argument("--daily-stats", help="Count the lines of each type and hour and the messages of each nick"
+                            " per day while converting, writing them to <DAILY_STATS> as JSON or SQLite tables.")
+        parser.add_argument("--stats", nargs="?", const="text", choices=("text", "json"), help="Time each stage of the"
+                            " conversion and count the records of each type, printing a summary as text or JSON to standard error.")
+        parser.add_argument("--profile", help="Profile the conversion with cProfile and dump the results to <PROFILE>,"
+                            " for reading with pstats or snakeviz.")
+        parser.add_argument("--per-channel", action="store_true", help="In batch mode write each channel's SQLite database"
+                            " to the --output directory rather than merging them into one.")
 
         arguments = parser.parse_args()
 
-        try:
-            converter = importlib.import_module("converters." + arguments.format)
-        except ImportError:
-            raise ValueError("Given format " + arguments.format.upper() + " has no valid converter.")
+        if arguments.search:
+            from utilities.search import search, format_match
+            if not arguments.output:
+                raise ValueError("Searching needs the database to search given with --output.")
+            for match in search(arguments.output, arguments.search, arguments.limit, arguments.channel):
+                print(format_match(match))
+            return
+        elif not arguments.logs:
+            raise ValueError("Did not specify the logs to convert.")
+
+        if not arguments.batch:
+            if not arguments.format:
+                arguments.format = converters.sniff(arguments.logs)
+            converter = conversion_wrapper.converter(arguments.format)
 
         if not arguments.oformat:
             raise ValueError("Did not specify an output format.")
         elif arguments.oformat not in supported_formats:
-            raise ValueError("Do not recognise output format '{}'".format(arguments.ofile))
-        elif arguments.oformat == 'sqlite':
-            raise ValueError("SQL formatting not implemented at this time. Check back for further updates to this software.")
+            raise ValueError("Do not recognise output format '{}'".format(arguments.oformat))
+        elif arguments.oformat == 'sqlite' and not arguments.output:
+            raise ValueError("SQLite output needs a database file given with --output.")
+        elif arguments.oformat == 'archive' and not arguments.output:
+            raise ValueError("Archive output needs a file given with --output.")
+
+        elif arguments.fts and arguments.oformat != 'sqlite':
+            raise ValueError("The full text index is only built for SQLite output.")
+        elif arguments.manifest and arguments.oformat in ('json', 'archive'):
+            raise ValueError("Incremental conversion needs an output format that can be appended to, such as jsonl or sqlite.")
+        elif arguments.manifest and arguments.format != 'energymech':
+            raise ValueError("Incremental conversion is only supported for energymech logs.")
+        elif arguments.batch and arguments.manifest:
+            raise ValueError("Incremental conversion is not supported in batch mode.")
+        elif arguments.batch and not arguments.output:
+            raise ValueError("Batch mode needs an --output database or directory.")
+        elif arguments.batch and (arguments.stats or arguments.profile):
+            raise ValueError("Statistics and profiling are not supported in batch mode.")
+        elif arguments.batch and arguments.daily_stats:
+            raise ValueError("Daily statistics are not supported in batch mode.")
+        elif arguments.follow and arguments.oformat not in ('jsonl', 'sqlite'):
+            raise ValueError("Following logs needs an output format that can be read as it is written, jsonl or sqlite.")
+        elif arguments.follow and (arguments.batch or arguments.manifest or arguments.jobs > 1 or arguments.bulk
+                                   or arguments.pipeline or arguments.since or arguments.until or arguments.cache):
+            raise ValueError("Following logs does not support --batch, --manifest, --jobs, --bulk, --pipeline,"
+                             " --since, --until or --cache.")
+        elif arguments.state and not arguments.follow:
+            raise ValueError("A --state file is only used with --follow.")
+
+        cache = None
+        if arguments.cache:
+            from utilities.cache import ParseCache
+            cache = ParseCache(arguments.cache, arguments.cache_size << 20)
+
+        if arguments.batch:
+            conversion_wrapper.batch(arguments, cache)
+            return
 
         ofile = arguments.output if arguments.output else sys.stdout
-        output_handler = BufferedJSONOutputHandler(ofile)
+        # Carrying on from a manifest or a --follow state adds to the output already there.
+        append = bool(arguments.manifest or arguments.state and os.path.exists(arguments.state))
+        output_handler = conversion_wrapper.output_handler(arguments.oformat, ofile, channel=arguments.channel,
+                                                           network=arguments.network, append=append,
+                                                           bulk=arguments.bulk, fts=arguments.fts,
+                                                           follow=arguments.follow)
+
+        options = conversion_wrapper.filters(arguments)
+        if arguments.jobs > 1:
+            options["jobs"] = arguments.jobs
+        if arguments.manifest:
+            from utilities.manifest import ConversionManifest
+            options["manifest"] = ConversionManifest(arguments.manifest)
+        if arguments.pipeline:
+            options["pipeline"] = True
+        if cache:
+            options["cache"] = cache
+
+        if arguments.daily_stats:
+            from utilities.daily import DailyStatsOutputHandler, daily_stats_sink
+            # SQLite output is always added to, so its counts are too.
+            sink = daily_stats_sink(arguments.daily_stats, arguments.channel,
+                                    replace=not (append or arguments.oformat == 'sqlite'))
+            output_handler = DailyStatsOutputHandler(output_handler, sink)
+        if arguments.stats:
+            from utilities.stats import ConversionStats, InstrumentedOutputHandler
+            stats = ConversionStats()
+            stats.time_input()
+            output_handler = InstrumentedOutputHandler(output_handler, stats)
+        if arguments.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
 
         try:
-            converter.convert(arguments.logs, output_handler)
+            if arguments.follow:
+                from utilities.follow import FollowState
+                converter.follow(arguments.logs, output_handler, FollowState(arguments.state),
+                                 interval=arguments.interval, **options)
+            else:
+                converter.convert(arguments.logs, output_handler, **options)
         except KeyboardInterrupt as ki:
             #Should mean we mostly get valid data out of truncated converts.
             output_handler.close()
-    
-conversion_wrapper.main()
+            # The days written before the interrupt are recorded, so the next run doesn't convert them again.
+            if arguments.manifest:
+                options["manifest"].save()
+
+        if arguments.profile:
+            profiler.disable()
+            profiler.dump_stats(arguments.profile)
+        if arguments.stats:
+            stats.finish(arguments.output)
+            if (not arguments.manifest and not arguments.follow and arguments.jobs == 1 and not arguments.cache
+                    and not conversion_wrapper.filters(arguments)):
+                stats.measure_input(arguments.logs)
+            print(stats.dumps(arguments.stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    conversion_wrapper.main()
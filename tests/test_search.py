@@ -0,0 +1,37 @@
+import os
+
+import subprocess
+
+import sys
+
+import tempfile
+
+import unittest
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(*arguments, timezone):
+  """Run the converter script with TZ set to timezone, returning its output."""
+  environment = dict(os.environ, TZ=timezone)
+  return subprocess.run([sys.executable, os.path.join(repository, "energymech-log-converter.py")] + list(arguments),
+                        cwd=repository, env=environment, capture_output=True, text=True, check=True).stdout
+
+class SearchTimezoneTest(unittest.TestCase):
+  """Search results show the time a line was logged at, whatever the local timezone."""
+
+  def test_match_shows_logged_time(self):
+    for timezone in ("UTC", "America/New_York", "Asia/Kolkata"):
+      with self.subTest(timezone=timezone), tempfile.TemporaryDirectory() as directory:
+        logs = os.path.join(directory, "logs")
+        os.mkdir(logs)
+        with open(os.path.join(logs, "irc.example.net_#chan_20140104.log"), 'w', encoding='latin-1') as log:
+          log.write("[19:01:26] <yes493> then\n[23:59:59] <late> midnight\n")
+        database = os.path.join(directory, "logs.db")
+        run(logs, "-f", "energymech", "--oformat", "sqlite", "-o", database, "-c", "#chan", "--fts", timezone=timezone)
+        self.assertEqual(run("--search", "then", "-o", database, timezone=timezone),
+                         "2014-01-04 19:01:26 #chan <yes493> then\n")
+        self.assertEqual(run("--search", "midnight", "-o", database, timezone=timezone),
+                         "2014-01-04 23:59:59 #chan <late> midnight\n")
+
+if __name__ == "__main__":
+  unittest.main()
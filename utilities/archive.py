@@ -0,0 +1,188 @@
+import array
+
+import bisect
+
+import itertools
+
+import mmap
+
+import struct
+
+import sys
+
+import zlib
+
+# An archive is a header, one block per day and an index of the blocks:
+#
+#   magic
+#   block, block, ...
+#   index: dates, offsets and lengths of the blocks, as little endian int64 arrays
+#   trailer: offset of the index, number of blocks, trailer magic
+#
+# Each block holds a day's lines column by column, every column compressed with
+# zlib on its own:
+#
+#   line ids          int64 per line
+#   timestamps        int64 per line
+#   type codes        uint8 per line, indexing the block's table of type names
+#   type names        NUL separated UTF-8
+#   field counts      uint8 per line, the number of fields after the timestamp
+#   field lengths     int32 per field in characters, -1 for a missing field
+#   field text        every field concatenated, UTF-8
+#
+# so a reader can mmap the file, look a date up in the index and decode just
+# the blocks it needs.
+
+magic = b"EMLCARC1"
+
+trailer_magic = b"EMLCIDX1"
+
+trailer = struct.Struct("<QQ8s")
+
+block_header = struct.Struct("<I7I")
+
+def little_endian(column):
+  """Return the bytes of an array in little endian order whatever the platform."""
+  if sys.byteorder == "big":
+    column = array.array(column.typecode, column)
+    column.byteswap()
+  return column.tobytes()
+
+def from_little_endian(typecode, data):
+  """Return an array of typecode read from little endian bytes."""
+  column = array.array(typecode)
+  column.frombytes(data)
+  if sys.byteorder == "big":
+    column.byteswap()
+  return column
+
+def encode_day(lines, level=1):
+  """Encode an iterable of converted lines as the bytes of one block."""
+  (line_ids, timestamps, type_codes) = (array.array("q"), array.array("q"), array.array("B"))
+  (field_counts, field_lengths, fields) = (array.array("B"), array.array("i"), [])
+  types = {}
+  count = 0
+  for line in lines:
+    count += 1
+    line_ids.append(line[0])
+    type_codes.append(types.setdefault(line[1], len(types)))
+    timestamps.append(line[2])
+    field_counts.append(len(line) - 3)
+    for field in line[3:]:
+      if field is None:
+        field_lengths.append(-1)
+      else:
+        field_lengths.append(len(field))
+        fields.append(field)
+  columns = [little_endian(line_ids), little_endian(timestamps), type_codes.tobytes(),
+             "\0".join(types).encode("utf-8"), field_counts.tobytes(), little_endian(field_lengths),
+             "".join(fields).encode("utf-8", "surrogateescape")]
+  columns = [zlib.compress(column, level) for column in columns]
+  return block_header.pack(count, *[len(column) for column in columns]) + b"".join(columns)
+
+def decode_day(block):
+  """Decode the bytes of one block back into a list of line tuples."""
+  (count, *lengths) = block_header.unpack_from(block)
+  (columns, position) = ([], block_header.size)
+  for length in lengths:
+    columns.append(zlib.decompress(block[position:position + length]))
+    position += length
+  line_ids = from_little_endian("q", columns[0])
+  timestamps = from_little_endian("q", columns[1])
+  types = columns[3].decode("utf-8").split("\0")
+  field_lengths = from_little_endian("i", columns[5])
+  text = columns[6].decode("utf-8", "surrogateescape")
+  (lines, field_index, offset) = ([], 0, 0)
+  for (line_id, type_code, timestamp, field_count) in zip(line_ids, columns[2], timestamps, columns[4]):
+    line = [line_id, types[type_code], timestamp]
+    for length in field_lengths[field_index:field_index + field_count]:
+      if length < 0:
+        line.append(None)
+      else:
+        line.append(text[offset:offset + length])
+        offset += length
+    field_index += field_count
+    lines.append(tuple(line))
+  return lines
+
+
+class ArchiveWriter():
+  """Write converted days to a columnar archive file, one block per day."""
+
+  def __init__(self, filepath, level=1):
+    self.outfile = open(filepath, 'wb') if isinstance(filepath, str) else filepath
+    self.level = level
+    self.outfile.write(magic)
+    self.position = len(magic)
+    (self.dates, self.offsets, self.lengths) = (array.array("q"), array.array("q"), array.array("q"))
+
+  def write_day(self, date, lines):
+    """Append the block for one day and remember where it starts."""
+    block = encode_day(lines, self.level)
+    self.outfile.write(block)
+    self.dates.append(date)
+    self.offsets.append(self.position)
+    self.lengths.append(len(block))
+    self.position += len(block)
+
+  def close(self):
+    """Write the index, sorted by date, and the trailer pointing at it."""
+    order = sorted(range(len(self.dates)), key=lambda block: (self.dates[block], self.offsets[block]))
+    for column in (self.dates, self.offsets, self.lengths):
+      self.outfile.write(little_endian(array.array("q", (column[block] for block in order))))
+    self.outfile.write(trailer.pack(self.position, len(order), trailer_magic))
+    self.outfile.close()
+
+
+class ArchiveReader():
+  """Random access to the days of an archive, through an mmap of the file.
+
+  Opening an archive only reads its index, looking up a day then decodes just
+  the blocks holding it."""
+
+  def __init__(self, filepath):
+    with open(filepath, 'rb') as archive_file:
+      self.map = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(self.map) < len(magic) + trailer.size or self.map[:len(magic)] != magic:
+      raise ValueError(filepath + " is not a log archive.")
+    (index_offset, blocks, end_magic) = trailer.unpack_from(self.map, len(self.map) - trailer.size)
+    if end_magic != trailer_magic:
+      raise ValueError(filepath + " is truncated, it has no index.")
+    columns = [from_little_endian("q", self.map[index_offset + column * blocks * 8:
+                                                 index_offset + (column + 1) * blocks * 8])
+               for column in range(3)]
+    (self.dates, self.offsets, self.lengths) = columns
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exception):
+    self.close()
+
+  def __len__(self):
+    return len(set(self.dates))
+
+  def date_list(self):
+    """Return the date timestamps of the days in the archive, in order."""
+    return sorted(set(self.dates))
+
+  def day(self, date):
+    """Return the lines logged on the day starting at the date timestamp date."""
+    start = bisect.bisect_left(self.dates, date)
+    return list(itertools.chain.from_iterable(self._block(block) for block in
+                                              range(start, bisect.bisect_right(self.dates, date))))
+
+  def days(self, start=None, end=None):
+    """Yield (date, lines) for each day with a date timestamp from start to end,
+    inclusive, either of which may be None to leave that end of the range open."""
+    first = 0 if start is None else bisect.bisect_left(self.dates, start)
+    last = len(self.dates) if end is None else bisect.bisect_right(self.dates, end)
+    for (date, blocks) in itertools.groupby(range(first, last), key=self.dates.__getitem__):
+      yield (date, list(itertools.chain.from_iterable(self._block(block) for block in blocks)))
+
+  def _block(self, block):
+    offset = self.offsets[block]
+    return decode_day(self.map[offset:offset + self.lengths[block]])
+
+  def close(self):
+    self.map.close()
@@ -0,0 +1,69 @@
+import glob
+
+import json
+
+import multiprocessing
+
+import os
+
+from converters import sniff
+
+def load_jobs(logs, format=None, channel=None, network=None):
+  """Expand a batch of logs into one job per channel.
+
+  logs is either a JSON file holding a list of objects with a "logs" path or
+  glob and optionally a "format", "channel" and "network", or a glob matching
+  channel directories and files directly. Anything an entry leaves out comes
+  from the arguments, and failing that the channel is named after the log's
+  directory or file and the network after the directory that holds it, as in
+  a bouncer's network/#channel tree. Logs without a format have it worked out
+  from their first lines."""
+  if logs.endswith(".json") and os.path.isfile(logs):
+    with open(logs, 'r', encoding='utf-8') as batch_file:
+      entries = json.load(batch_file)
+  else:
+    entries = [{"logs":logs}]
+  jobs = []
+  for entry in entries:
+    paths = sorted(glob.glob(entry["logs"]))
+    if not paths:
+      raise ValueError("No logs match " + entry["logs"] + ".")
+    for path in paths:
+      path = os.path.normpath(path)
+      job = {"logs":path,
+             "format":entry.get("format", format) or sniff(path),
+             "channel":entry.get("channel", channel) or channel_name(path),
+             "network":entry.get("network", network) or os.path.basename(os.path.dirname(os.path.abspath(path))),
+             "size":log_size(path)}
+      jobs.append(job)
+  return jobs
+
+def channel_name(path):
+  """Name a channel after its log directory, or its log file without the extension."""
+  if os.path.isdir(path):
+    return os.path.basename(path)
+  return os.path.splitext(os.path.basename(path))[0]
+
+def log_size(path):
+  """Return the number of bytes in a log file or a directory of them."""
+  if os.path.isdir(path):
+    return sum(os.path.getsize(os.path.join(path, filename)) for filename in os.listdir(path))
+  return os.path.getsize(path)
+
+def output_filename(job, extension):
+  """Return a filename for the output of a single job, unique to its network and channel."""
+  name = "_".join(part for part in (job["network"], job["channel"]) if part)
+  return name.replace(os.sep, "_") + "." + extension
+
+def run_jobs(jobs, worker, processes=1):
+  """Call worker on each job, largest first so the long jobs are not left until
+  last, and yield what it returns in that same order.
+
+  With more than one process the jobs run in a pool, while the results of the
+  first ones are being used the rest carry on in the background."""
+  jobs = sorted(jobs, key=lambda job: job["size"], reverse=True)
+  if processes > 1:
+    with multiprocessing.Pool(processes) as pool:
+      yield from pool.imap(worker, jobs)
+  else:
+    yield from map(worker, jobs)
@@ -0,0 +1,124 @@
+import hashlib
+
+import marshal
+
+import os
+
+import struct
+
+import sys
+
+from utilities.files import file_digest
+
+class ParseCache():
+  """An on-disk cache of the records parsed from log files, so that converting
+  the same logs again, to another output format or after a crash, loads them
+  instead of parsing them.
+
+  An entry is keyed by a hash of the file's path and content, the name and source
+  of the converter module that parsed it and any options its records depend on,
+  so a changed log or converter is parsed afresh. It holds a sequence of items,
+  each serialized with marshal, which reads tuples of strings and ints back many
+  times faster than they are parsed and keeps interned nicknames interned. Once
+  the entries add up to more than max_bytes the least recently used are removed,
+  an entry's modification time being updated whenever it is loaded."""
+
+  suffix = ".marshal"
+  length = struct.Struct("<Q")
+
+  def __init__(self, directory, max_bytes=1 << 30):
+    os.makedirs(directory, exist_ok=True)
+    (self.directory, self.max_bytes) = (directory, max_bytes)
+    self.versions = {}
+    self.evict()
+
+  def key(self, filepath, converter, *options):
+    """Return the key of a log file parsed by the named converter module with options."""
+    if converter not in self.versions:
+      self.versions[converter] = file_digest(sys.modules[converter].__file__)
+    key = (os.path.abspath(filepath), file_digest(filepath), converter, self.versions[converter],
+           sys.version_info[:2], options)
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+  def path(self, key):
+    return os.path.join(self.directory, key + self.suffix)
+
+  def cached(self, filepath, parse, converter, *options):
+    """Return an iterator over the items parse() returns for a log file, loaded
+    from the cache if it was parsed the same way before, otherwise stored in it
+    as they are iterated over."""
+    key = self.key(filepath, converter, *options)
+    items = self.load(key)
+    if items is None:
+      items = self.store(key, parse())
+    return items
+
+  def load(self, key):
+    """Return an iterator over the items of an entry, or None if there is none."""
+    try:
+      entry = open(self.path(key), 'rb')
+    except FileNotFoundError:
+      return None
+    try:
+      os.utime(entry.fileno())
+    except OSError:
+      pass
+    return self.read(entry)
+
+  def read(self, entry):
+    (length, loads) = (self.length, marshal.loads)
+    with entry:
+      while True:
+        prefix = entry.read(length.size)
+        if not prefix:
+          return
+        yield loads(entry.read(length.unpack(prefix)[0]))
+
+  def store(self, key, items):
+    """Yield each of items, writing them to an entry that is only added to the
+    cache once they are exhausted, so an interrupted conversion leaves none."""
+    path = self.path(key)
+    temporary_path = "{}.{}.tmp".format(path, os.getpid())
+    (length, dumps) = (self.length, marshal.dumps)
+    try:
+      with open(temporary_path, 'wb') as entry:
+        for item in items:
+          data = dumps(item)
+          entry.write(length.pack(len(data)))
+          entry.write(data)
+          yield item
+        size = entry.tell()
+      if size > self.max_bytes:
+        os.remove(temporary_path)
+        return
+      os.replace(temporary_path, path)
+    except BaseException:
+      if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+      raise
+    self.size += size
+    if self.size > self.max_bytes:
+      self.evict()
+
+  def evict(self):
+    """Remove the least recently used entries until the cache is no larger than
+    max_bytes. Several processes may share the cache, so entries can disappear
+    under it."""
+    entries = []
+    for entry in os.scandir(self.directory):
+      if entry.name.endswith(self.suffix):
+        try:
+          stat = entry.stat()
+        except FileNotFoundError:
+          continue
+        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    entries.sort()
+    self.size = sum(size for (mtime, size, path) in entries)
+    for (mtime, size, path) in entries:
+      if self.size <= self.max_bytes:
+        break
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      self.size -= size
@@ -0,0 +1,114 @@
+
+import io
+
+import time
+
+# Each compression module is imported by its opener, the first time a file in
+# its format is opened, so the others are never loaded.
+
+def gzip_open(filepath, mode, encoding):
+  import gzip
+  return gzip.open(filepath, mode, encoding=encoding)
+
+def bz2_open(filepath, mode, encoding):
+  import bz2
+  return bz2.open(filepath, mode, encoding=encoding)
+
+def lzma_open(filepath, mode, encoding):
+  import lzma
+  return lzma.open(filepath, mode, encoding=encoding)
+
+def zstd_open(filepath, mode, encoding):
+  """Open a zstandard file, which needs either Python 3.14's compression.zstd or
+  the zstandard package."""
+  try:
+    from compression import zstd
+  except ImportError:
+    try:
+      import zstandard as zstd
+    except ImportError:
+      raise ValueError(filepath + " is zstandard compressed, which needs the zstandard package installed.")
+  return zstd.open(filepath, mode, encoding=encoding)
+
+# The magic bytes each compressed format starts with, the extensions it is
+# written with and the function that opens it as a stream.
+compressors = ((b"\x1f\x8b", (".gz",), gzip_open),
+               (b"BZh", (".bz2",), bz2_open),
+               (b"\xfd7zXZ\x00", (".xz", ".lzma"), lzma_open),
+               (b"\x28\xb5\x2f\xfd", (".zst",), zstd_open))
+
+# While --stats times the input, a function called with each block read from a
+# log, through open_log or read_mapped, and the seconds it took to read.
+read_hook = None
+
+class TimedReader(io.BufferedIOBase):
+  """A binary stream of what is read, and decompressed, from another one, handing
+  each block to read_hook with the time it took."""
+
+  def __init__(self, stream):
+    io.BufferedIOBase.__init__(self)
+    self.stream = stream
+
+  def readable(self):
+    return True
+
+  def read(self, size=-1):
+    return self.timed(self.stream.read, size)
+
+  def read1(self, size=-1):
+    return self.timed(getattr(self.stream, "read1", self.stream.read), size)
+
+  def timed(self, read, size):
+    start = time.perf_counter()
+    data = read(size)
+    read_hook(data, time.perf_counter() - start)
+    return data
+
+  def close(self):
+    self.stream.close()
+    io.BufferedIOBase.close(self)
+
+def read_mapped(log, start, stop):
+  """Return the bytes from start to stop of a memory mapped log, which are read in
+  from the file as they are copied."""
+  if read_hook is None:
+    return log[start:stop]
+  begun = time.perf_counter()
+  data = log[start:stop]
+  read_hook(data, time.perf_counter() - begun)
+  return data
+
+def open_bytes(filepath, offset=0):
+  """Open an uncompressed log file to read its bytes from offset on, timed through
+  TimedReader if read_hook is set."""
+  log = open(filepath, 'rb')
+  log.seek(offset)
+  return TimedReader(log) if read_hook is not None else log
+
+def is_compressed(filepath):
+  """Return whether a file starts with the magic bytes of a supported compressed format."""
+  with open(filepath, 'rb') as log:
+    magic = log.read(6)
+  return any(magic.startswith(signature) for (signature, extensions, opener) in compressors)
+
+def open_log(filepath, mode='r', encoding='latin-1'):
+  """Open a log file in text mode, decompressing or compressing it on the fly.
+
+  When reading, the format is detected from the magic bytes at the start of the
+  file so misnamed files still work, and reads are timed through TimedReader if
+  read_hook is set. When writing or appending it is chosen by the file
+  extension. Anything else is opened as plain text."""
+  if mode == 'r':
+    with open(filepath, 'rb') as log:
+      magic = log.read(6)
+    opener = next((opener for (signature, extensions, opener) in compressors if magic.startswith(signature)), None)
+    if read_hook is not None:
+      stream = opener(filepath, 'rb', encoding=None) if opener else open(filepath, 'rb')
+      return io.TextIOWrapper(TimedReader(stream), encoding=encoding)
+    if opener:
+      return opener(filepath, 'rt', encoding=encoding)
+  else:
+    for (signature, extensions, opener) in compressors:
+      if filepath.endswith(extensions):
+        return opener(filepath, mode + 't', encoding=encoding)
+  return open(filepath, mode, encoding=encoding)
@@ -0,0 +1,172 @@
+import collections
+
+import json
+
+import os
+
+import sqlite3
+
+from utilities.files import write_json
+
+from utilities.symbols import normalise_nick
+
+class DailyStats():
+  """Counts of the lines converted on each day, for activity dashboards: lines of
+  each type, messages sent by each nick and lines logged in each hour.
+
+  Days are keyed by their date timestamp, and nicks are lowercased as in the
+  SQLite output. Only PRIVMSGs and ACTIONs count as messages of a nick."""
+
+  message_types = frozenset(("PRIVMSG", "ACTION"))
+
+  def __init__(self):
+    self.days = {}
+
+  def count(self, date, lines):
+    """Yield lines, adding them to the counts of the day at the date timestamp date
+    once they are exhausted."""
+    # Plain dictionaries count about twice as fast as Counters in this loop.
+    (types, nicks, hours) = ({}, {}, [0] * 25)
+    (type_count, nick_count) = (types.get, nicks.get)
+    message_types = self.message_types
+    for line in lines:
+      line_type = line[1]
+      types[line_type] = type_count(line_type, 0) + 1
+      hours[line[2] // 3600] += 1
+      if line_type in message_types:
+        nick = line[3]
+        nicks[nick] = nick_count(nick, 0) + 1
+      yield line
+    hours[23] += hours.pop() # Leap seconds.
+    normalised = collections.Counter()
+    for (nick, messages) in nicks.items():
+      if nick:
+        normalised[normalise_nick(nick)] += messages
+    self.add(date, types, normalised, hours)
+
+  def add(self, date, types, nicks, hours):
+    """Add counts of lines by type, messages by nick and lines by hour to a day."""
+    if date not in self.days:
+      self.days[date] = (collections.Counter(), collections.Counter(), [0] * 24)
+    (day_types, day_nicks, day_hours) = self.days[date]
+    day_types.update(types)
+    day_nicks.update(nicks)
+    for (hour, lines) in enumerate(hours):
+      day_hours[hour] += lines
+
+  def update(self, other):
+    """Add the counts of another DailyStats to these."""
+    for (date, (types, nicks, hours)) in other.days.items():
+      self.add(date, types, nicks, hours)
+
+  def summary(self):
+    """Return the counts as a dictionary, ready to be dumped as JSON."""
+    return dict((str(date), {"types":dict(types.most_common()), "nicks":dict(nicks.most_common()), "hours":hours})
+                for (date, (types, nicks, hours)) in sorted(self.days.items()))
+
+  def load(self, summary):
+    """Add the counts of a dictionary returned by summary to these."""
+    for (date, day) in summary.items():
+      self.add(int(date), day["types"], day["nicks"], day["hours"])
+
+
+class DailyStatsDatabase():
+  """Writes daily statistics to summary tables in a SQLite database, which may be
+  the one the logs are converted to, adding them to the counts already there for
+  the channel unless replace is set, in which case those are cleared first."""
+
+  def __init__(self, filepath, channel=None, replace=False):
+    self.conn = sqlite3.connect(filepath)
+    self.channel = (channel or "").lower()
+    with self.conn:
+      self.conn.execute("CREATE TABLE IF NOT EXISTS daily_types(channel TEXT, date INTEGER, type TEXT,"
+                        " lines INTEGER, PRIMARY KEY (channel, date, type)) WITHOUT ROWID")
+      self.conn.execute("CREATE TABLE IF NOT EXISTS daily_nicks(channel TEXT, date INTEGER, nick TEXT,"
+                        " messages INTEGER, PRIMARY KEY (channel, date, nick)) WITHOUT ROWID")
+      self.conn.execute("CREATE TABLE IF NOT EXISTS daily_hours(channel TEXT, date INTEGER, hour INTEGER,"
+                        " lines INTEGER, PRIMARY KEY (channel, date, hour)) WITHOUT ROWID")
+      if replace:
+        for table in ("daily_types", "daily_nicks", "daily_hours"):
+          self.conn.execute("DELETE FROM {} WHERE channel = ?".format(table), (self.channel,))
+
+  def write(self, stats):
+    """Add the counts of a DailyStats to the tables."""
+    channel = self.channel
+    with self.conn:
+      self.conn.executemany("INSERT INTO daily_types VALUES (?, ?, ?, ?) ON CONFLICT (channel, date, type)"
+                            " DO UPDATE SET lines = lines + excluded.lines",
+                            ((channel, date, line_type, lines) for (date, (types, nicks, hours)) in stats.days.items()
+                             for (line_type, lines) in types.items()))
+      self.conn.executemany("INSERT INTO daily_nicks VALUES (?, ?, ?, ?) ON CONFLICT (channel, date, nick)"
+                            " DO UPDATE SET messages = messages + excluded.messages",
+                            ((channel, date, nick, messages) for (date, (types, nicks, hours)) in stats.days.items()
+                             for (nick, messages) in nicks.items()))
+      self.conn.executemany("INSERT INTO daily_hours VALUES (?, ?, ?, ?) ON CONFLICT (channel, date, hour)"
+                            " DO UPDATE SET lines = lines + excluded.lines",
+                            ((channel, date, hour, lines) for (date, (types, nicks, hours)) in stats.days.items()
+                             for (hour, lines) in enumerate(hours) if lines))
+
+  def close(self):
+    self.conn.close()
+
+
+class DailyStatsJSON():
+  """Writes daily statistics to a JSON file of DailyStats.summary, adding them to
+  the counts already in it unless replace is set."""
+
+  def __init__(self, filepath, replace=False):
+    self.filepath = filepath
+    self.totals = DailyStats()
+    if not replace and os.path.exists(filepath):
+      with open(filepath, 'r', encoding='utf-8') as stats_file:
+        self.totals.load(json.load(stats_file))
+
+  def write(self, stats):
+    """Add the counts of a DailyStats to the totals and write them all out."""
+    self.totals.update(stats)
+    write_json(self.filepath, self.totals.summary(), separators=(',', ':'))
+
+  def close(self):
+    pass
+
+
+def daily_stats_sink(filepath, channel=None, replace=False):
+  """Return the sink writing daily statistics to filepath, as JSON if it ends in
+  .json and otherwise to tables of a SQLite database."""
+  if filepath.endswith(".json"):
+    return DailyStatsJSON(filepath, replace)
+  return DailyStatsDatabase(filepath, channel, replace)
+
+
+class DailyStatsOutputHandler():
+  """Wraps an output handler to count the lines of each day as they pass through
+  it, in the same pass as they are written, so dashboards never have to read the
+  converted lines again. The counts are written to the sink when the output is
+  flushed or closed."""
+
+  def __init__(self, output_handler, sink):
+    self.output_handler = output_handler
+    self.sink = sink
+    self.stats = DailyStats()
+
+  def begin(self):
+    self.output_handler.begin()
+
+  def write_day(self, day):
+    stats = self.stats
+    self.output_handler.write_day(dict((date, stats.count(date, lines)) for (date, lines) in day.items()))
+
+  def flush(self):
+    self.output_handler.flush()
+    self._write()
+
+  def close(self):
+    self.output_handler.close()
+    self._write()
+    self.sink.close()
+
+  def _write(self):
+    """Hand the counts since the last write to the sink and start afresh."""
+    if self.stats.days:
+      self.sink.write(self.stats)
+    self.stats = DailyStats()
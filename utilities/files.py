@@ -0,0 +1,46 @@
+import hashlib
+
+import json
+
+import os
+
+def file_digest(filepath, size=None):
+  """Return the SHA-256 hex digest of a file, or of its first size bytes."""
+  digest = hashlib.sha256()
+  remaining = os.path.getsize(filepath) if size is None else size
+  with open(filepath, 'rb') as log:
+    while remaining > 0:
+      chunk = log.read(min(remaining, 1 << 20))
+      if not chunk:
+        break
+      digest.update(chunk)
+      remaining -= len(chunk)
+  return digest.hexdigest()
+
+def complete_size(filepath, block_size=1 << 16):
+  """Return the number of bytes of a file up to and including its last newline,
+  leaving out a last line that is still being written."""
+  with open(filepath, 'rb') as log:
+    end = log.seek(0, os.SEEK_END)
+    while end > 0:
+      start = max(0, end - block_size)
+      log.seek(start)
+      newline = log.read(end - start).rfind(b"\n")
+      if newline >= 0:
+        return start + newline + 1
+      end = start
+  return 0
+
+def write_json(filepath, data, **options):
+  """Dump data as JSON to filepath, through a temporary file named after this
+  process that replaces it once complete, so neither an interrupted write nor a
+  concurrent run leaves a truncated file. Options are passed on to json.dump."""
+  temporary_path = "{}.{}.tmp".format(filepath, os.getpid())
+  try:
+    with open(temporary_path, 'w', encoding='utf-8') as json_file:
+      json.dump(data, json_file, **options)
+    os.replace(temporary_path, filepath)
+  except BaseException:
+    if os.path.exists(temporary_path):
+      os.remove(temporary_path)
+    raise
@@ -0,0 +1,85 @@
+import io
+
+import json
+
+import os
+
+import time
+
+from utilities.compression import is_compressed
+
+from utilities.files import write_json
+
+class FollowState():
+  """How far a --follow run has got: the log file being tailed, the byte offset
+  it has been converted up to and the next line id to hand out.
+
+  Given a filepath the state is loaded from and saved to it as JSON, so that a
+  restarted run carries on from the same line, otherwise it is only kept in
+  memory and following starts from the beginning of the newest file."""
+
+  def __init__(self, filepath=None):
+    self.filepath = filepath
+    (self.file, self.offset, self.next_line_id) = (None, 0, 0)
+    if filepath and os.path.exists(filepath):
+      with open(filepath, 'r', encoding='utf-8') as state_file:
+        state = json.load(state_file)
+      (self.file, self.offset, self.next_line_id) = (state["file"], state["offset"], state["next_line_id"])
+
+  def save(self):
+    if self.filepath:
+      write_json(self.filepath, {"file":self.file, "offset":self.offset, "next_line_id":self.next_line_id})
+
+def read_appended(filepath, offset, limit=1 << 24):
+  """Return (lines, offset) for the complete lines written to a file after the
+  byte offset, up to about limit bytes of them, and the offset they end at.
+
+  A last line still being written is left for the next read. A file that has
+  become shorter than offset was truncated or replaced, and is read again from
+  the start. Lines are decoded and split as when the whole file is read."""
+  with open(filepath, 'rb') as log:
+    if os.fstat(log.fileno()).st_size < offset:
+      offset = 0
+    log.seek(offset)
+    data = log.read(limit)
+  end = data.rfind(b"\n") + 1
+  if not end:
+    return ([], offset)
+  return (io.StringIO(data[:end].decode('latin-1'), newline=None).readlines(), offset + end)
+
+def follow(newest, parse, output_handler, state, interval=1.0):
+  """Convert the lines appended to a growing log file as they arrive, until
+  interrupted.
+
+  newest() returns the path of the file to tail, or None while there is none,
+  and when it changes the rest of the old file is converted before moving on to
+  the new one from its start. parse(filepath, lines, line_id) yields the
+  (date_timestamp, records) of a list of new lines. Each batch is written to the
+  output handler and flushed, then the state saved, and the file is polled
+  every interval seconds while nothing new is written to it."""
+  def convert_appended(filepath):
+    (lines, offset) = read_appended(filepath, state.offset)
+    if not lines:
+      return False
+    for (date_timestamp, records) in parse(filepath, lines, state.next_line_id):
+      output_handler.write_day({date_timestamp:records})
+    output_handler.flush()
+    (state.offset, state.next_line_id) = (offset, state.next_line_id + len(lines))
+    state.save()
+    return True
+
+  output_handler.begin()
+  while True:
+    filepath = newest()
+    if filepath:
+      filepath = os.path.abspath(filepath)
+      if filepath != state.file:
+        if state.file and os.path.exists(state.file):
+          while convert_appended(state.file):
+            pass
+        if is_compressed(filepath):
+          raise ValueError(filepath + " is compressed, only plain log files can be followed.")
+        (state.file, state.offset) = (filepath, 0)
+      if convert_appended(filepath):
+        continue
+    time.sleep(interval)
@@ -0,0 +1,104 @@
+
+import json
+
+import os
+
+import signal
+
+import threading
+
+from utilities.compression import is_compressed
+
+from utilities.files import complete_size, file_digest, write_json
+
+class ConversionManifest():
+  """A record of the log files a conversion has already processed, stored as JSON
+  so that later runs can convert only the files that are new or have changed.
+
+  For every file the manifest keeps its size, modification time, content hash and
+  number of lines, along with the last line id handed out across all files."""
+
+  def __init__(self, filepath):
+    self.filepath = filepath
+    if os.path.exists(filepath):
+      with open(filepath, 'r', encoding='utf-8') as manifest_file:
+        manifest = json.load(manifest_file)
+      self.files = manifest["files"]
+      self.next_line_id = manifest["next_line_id"]
+    else:
+      self.files = {}
+      self.next_line_id = 0
+    self.snapshots = {}
+
+  def plan(self, filepath):
+    """Work out how much of a file still needs converting.
+
+    Returns None when the file is unchanged since it was recorded, otherwise the
+    number of lines at the start of the file that were already converted, which
+    is non-zero when the file has only been appended to. Raises ValueError for a
+    recorded file that was changed some other way, as its lines would be added
+    to the output a second time.
+
+    Only complete lines are converted, so of an uncompressed file just the bytes
+    up to its last newline are recorded, and a last line still being written is
+    converted once it is finished."""
+    stat = os.stat(filepath)
+    name = os.path.basename(filepath)
+    entry = self.files.get(name)
+    if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+      return None
+    size = stat.st_size if is_compressed(filepath) else complete_size(filepath)
+    digest = file_digest(filepath, size)
+    if entry and entry["size"] == size and entry["sha256"] == digest:
+      entry["mtime"] = stat.st_mtime_ns
+      return None
+    self.snapshots[name] = {"size":size, "mtime":stat.st_mtime_ns, "sha256":digest}
+    if entry:
+      if size > entry["size"] and file_digest(filepath, entry["size"]) == entry["sha256"]:
+        return entry["lines"]
+      raise ValueError(filepath + " has changed since it was converted, rather than only being appended to."
+                       " Convert the logs again without the manifest.")
+    return 0
+
+  def record(self, filepath, lines):
+    """Remember a file as converted, with lines lines, as it stood when it was planned.
+
+    A file still being written may have grown since, the extra lines are counted 
+    in lines and will be skipped as part of the recorded prefix next time."""
+    name = os.path.basename(filepath)
+    self.files[name] = dict(self.snapshots.pop(name), lines=lines)
+
+  def save(self):
+    write_json(self.filepath, {"next_line_id":self.next_line_id, "files":self.files})
+
+class DeferredInterrupt():
+  """Holds back Ctrl-C during a conversion that keeps a manifest, so that it
+  stops between days rather than part way through writing one the manifest
+  doesn't record. check() raises the KeyboardInterrupt, and is called once the
+  last day written is recorded and before the next is begun. A second Ctrl-C
+  stops at once.
+
+  Only the main thread receives signals, elsewhere, or when not enabled, this
+  does nothing."""
+
+  def __init__(self, enabled=True):
+    self.enabled = enabled and threading.current_thread() is threading.main_thread()
+    self.interrupted = False
+
+  def __enter__(self):
+    if self.enabled:
+      self.previous = signal.signal(signal.SIGINT, self.interrupt)
+    return self
+
+  def interrupt(self, signum, frame):
+    if self.interrupted:
+      raise KeyboardInterrupt
+    self.interrupted = True
+
+  def check(self):
+    if self.interrupted:
+      raise KeyboardInterrupt
+
+  def __exit__(self, *exception):
+    if self.enabled:
+      signal.signal(signal.SIGINT, self.previous)
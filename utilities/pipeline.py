@@ -0,0 +1,144 @@
+import io
+
+import itertools
+
+import os
+
+import queue
+
+import threading
+
+from utilities.compression import open_log, open_bytes
+
+# Marks the end of the items passed between the stages of a pipeline.
+finished = object()
+
+class Stage(threading.Thread):
+  """A daemon thread moving items through a bounded queue, so that the stage
+  before it blocks once depth items are waiting rather than running ahead.
+
+  An exception in the thread is kept and raised again in the thread that
+  collects its output, and setting stopped makes the thread give up at the next
+  item so an abandoned pipeline does not leave it blocked forever."""
+
+  def __init__(self, depth):
+    threading.Thread.__init__(self, daemon=True)
+    self.queue = queue.Queue(depth)
+    self.stopped = threading.Event()
+    self.error = None
+
+  def put(self, item):
+    """Queue an item, returning False if the stage was stopped while waiting."""
+    while not self.stopped.is_set():
+      try:
+        self.queue.put(item, timeout=0.1)
+        return True
+      except queue.Full:
+        pass
+    return False
+
+  def reraise(self):
+    if self.error is not None:
+      raise self.error
+
+
+class Prefetcher(Stage):
+  """Runs an iterable in the thread, queueing up to depth of its items ahead of
+  the consumer."""
+
+  def __init__(self, iterable, depth):
+    Stage.__init__(self, depth)
+    self.iterable = iterable
+
+  def run(self):
+    try:
+      for item in self.iterable:
+        if not self.put(item):
+          return
+    except BaseException as error:
+      self.error = error
+    self.put(finished)
+
+
+class Writer(Stage):
+  """Calls output_handler.write_day in the thread for each day queued to it."""
+
+  def __init__(self, output_handler, depth):
+    Stage.__init__(self, depth)
+    self.output_handler = output_handler
+
+  def run(self):
+    while True:
+      day = self.queue.get()
+      if day is finished:
+        return
+      try:
+        self.output_handler.write_day(day)
+      except BaseException as error:
+        self.error = error
+        self.stopped.set()
+        return
+
+
+def prefetch(iterable, depth=4):
+  """Yield the items of iterable, which is run in a background thread that stays
+  at most depth items ahead."""
+  stage = Prefetcher(iterable, depth)
+  stage.start()
+  try:
+    while True:
+      item = stage.queue.get()
+      if item is finished:
+        stage.reraise()
+        return
+      yield item
+  finally:
+    stage.stopped.set()
+
+def write_behind(output_handler, days, depth=4):
+  """Write each (date, lines) of days with output_handler.write_day in a
+  background thread, while the calling thread goes on to produce the next day.
+
+  At most depth days wait to be written, the lines of each must already be a
+  list so no parsing happens in the writer thread."""
+  writer = Writer(output_handler, depth)
+  writer.start()
+  try:
+    for (date, lines) in days:
+      if not writer.put({date:lines}):
+        break
+  finally:
+    writer.put(finished)
+    writer.join()
+  writer.reraise()
+
+def read_lines(filepath, skip_lines=0, block_size=1 << 20):
+  """Yield the lines of a log file in lists of about block_size characters,
+  passing over the first skip_lines lines."""
+  with open_log(filepath, 'r', encoding='latin-1') as log:
+    for line in itertools.islice(log, skip_lines):
+      pass
+    while True:
+      block = log.readlines(block_size)
+      if not block:
+        return
+      yield block
+
+def read_range(filepath, start=0, end=None, block_size=1 << 20):
+  """Yield the lines of an uncompressed log file from byte start to byte end, both
+  at the start of a line, in lists of about block_size bytes, decoded and split
+  as read_lines would."""
+  end = os.path.getsize(filepath) if end is None else end
+  with open_bytes(filepath, start) as log:
+    (remaining, carry) = (end - start, b"")
+    while remaining > 0:
+      block = log.read(min(block_size, remaining))
+      if not block:
+        break
+      remaining -= len(block)
+      block = carry + block
+      # Hold back a last line that runs on into the next block.
+      cut = block.rfind(b"\n") + 1 if remaining > 0 else len(block)
+      (block, carry) = (block[:cut], block[cut:])
+      if block:
+        yield io.StringIO(block.decode('latin-1'), newline=None).readlines()
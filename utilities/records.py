@@ -0,0 +1,20 @@
+
+# Converted lines are plain tuples of the form (line_id, type, timestamp, fields...),
+# with type codes taken from string literals and nicknames interned by the
+# converters, so those strings are shared between lines rather than stored once
+# per line. A tuple costs noticeably less memory than a list of the same items,
+# and a tuple subclass with empty __slots__ would cost the same as a tuple while
+# being slower to build, so no record class is used.
+
+def renumber(record, offset):
+  """Return the record with offset added to its line id."""
+  return (record[0] + offset,) + record[1:]
+
+def filter_types(days, types):
+  """Yield (date, lines) for each of days with only the lines of the given types,
+  keeping lists as lists and streams as streams."""
+  for (date, lines) in days:
+    if isinstance(lines, list):
+      yield (date, [line for line in lines if line[1] in types])
+    else:
+      yield (date, (line for line in lines if line[1] in types))
@@ -0,0 +1,55 @@
+import sqlite3
+
+import time
+
+def search(filepath, query, limit=50, channel=None):
+  """Search the full text index of a SQLite database written with --fts.
+
+  query is an FTS5 query, e.g. 'python AND release' or '"exact phrase"'. The
+  most recent limit matches, optionally only those in channel, are returned
+  oldest first as (timestamp, channel, type, nick, text) tuples."""
+  conn = sqlite3.connect(filepath)
+  try:
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'message_text'").fetchone():
+      raise ValueError(filepath + " has no full text index, convert it with --fts to build one.")
+    # The matches are found first and the text of each is then looked up on its
+    # own, as joining the message_lines view to them makes SQLite build the
+    # whole view.
+    try:
+      matches = conn.execute("SELECT messages.id, messages.timestamp, channels.channel, msg_types.type"
+                             " FROM messages"
+                             " LEFT JOIN channels ON channels.id = messages.channel"
+                             " LEFT JOIN msg_types ON msg_types.id = messages.type"
+                             " WHERE messages.id IN (SELECT message_text.rowid FROM message_text"
+                             " JOIN messages ON messages.id = message_text.rowid"
+                             " WHERE message_text MATCH :query AND (:channel IS NULL OR messages.channel IN"
+                             " (SELECT id FROM channels WHERE channel = :channel))"
+                             " ORDER BY message_text.rowid DESC LIMIT :limit)"
+                             " ORDER BY messages.id",
+                             {"query":query, "channel":channel.lower() if channel else None, "limit":limit}).fetchall()
+    except sqlite3.OperationalError as error:
+      raise ValueError("Could not search for " + repr(query) + ": " + str(error))
+    rows = []
+    for (mid, timestamp, channel_name, line_type) in matches:
+      (nick, text) = conn.execute("SELECT nicks.nickname, message_lines.text FROM message_lines"
+                                  " LEFT JOIN nicks ON nicks.id = message_lines.nid"
+                                  " WHERE message_lines.mid = ?", (mid,)).fetchone()
+      rows.append((timestamp, channel_name, line_type, nick, text))
+  finally:
+    conn.close()
+  return rows
+
+# How each type of match is shown, roughly as energymech logs it.
+match_formats = {"PRIVMSG":"<{nick}> {text}", "ACTION":"* {nick} {text}", "NOTICE":"-{nick}- {text}",
+                 "CTCP":"[{nick}] {text}", "PART":"*** Parts: {nick} ({text})", "QUIT":"*** Quits: {nick} ({text})",
+                 "KICK":"*** kicked by {nick} ({text})", "TOPIC":"*** {nick} changes topic to '{text}'"}
+
+def format_match(match):
+  """Format a search match as a log line with its date, time and channel.
+
+  Timestamps are stored from the local midnights of the dates logged, so they
+  are shown in local time too."""
+  (timestamp, channel, line_type, nick, text) = match
+  line = match_formats.get(line_type, "<{nick}> {text}").format(nick=nick, text=text)
+  return "{} {}{}".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(int(timestamp))),
+                          channel + " " if channel else "", line)
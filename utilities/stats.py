@@ -0,0 +1,133 @@
+import collections
+
+import json
+
+import os
+
+import time
+
+from utilities import compression
+
+class ConversionStats():
+  """Timings and counts gathered over a conversion, for --stats.
+
+  The read stage is the time spent reading and decompressing the logs, timed
+  block by block inside the readers while time_input is in effect, which also
+  counts the lines read. The output stage is the time spent in the output
+  handler, less any time it spent waiting on the converter for lines, and the
+  parse stage the rest, so the three add up to the total. With --pipeline the
+  reading overlaps the other stages in its own thread, and with --jobs the
+  reading and parsing done in worker processes are only seen as parse time."""
+
+  def __init__(self):
+    self.stages = collections.OrderedDict((("read", 0.0), ("parse", 0.0), ("output", 0.0)))
+    self.types = collections.Counter()
+    self.days = 0
+    self.waiting = 0.0
+    self.lines_read = None
+    self.lines_counted = 0
+    self.bytes_in = None
+    self.bytes_out = None
+    self.started = time.perf_counter()
+    self.total = None
+
+  def count(self, lines):
+    """Yield lines, adding up how long they take to arrive and counting their types."""
+    (clock, types) = (time.perf_counter, self.types)
+    lines = iter(lines)
+    waiting = 0.0
+    while True:
+      start = clock()
+      line = next(lines, None)
+      waiting += clock() - start
+      if line is None:
+        break
+      types[line[1]] += 1
+      yield line
+    self.waiting += waiting
+
+  def time_input(self):
+    """Time the reads of the logs from here until finish."""
+    compression.read_hook = self.read
+
+  def read(self, data, seconds):
+    self.stages["read"] += seconds
+    self.lines_counted += data.count(b"\n")
+
+  def measure_input(self, logs):
+    """Record the bytes in the logs, a file or a directory of them, and the lines
+    read from them, for a conversion that read them whole, so the lines that
+    were not parsed can be told."""
+    paths = [os.path.join(logs, name) for name in sorted(os.listdir(logs))] if os.path.isdir(logs) else [logs]
+    self.lines_read = self.lines_counted
+    self.bytes_in = sum(os.path.getsize(path) for path in paths)
+
+  def finish(self, output=None):
+    """Stop the clock and the timing of reads, and record the size of the output
+    if it went to a file."""
+    self.total = time.perf_counter() - self.started
+    compression.read_hook = None
+    self.stages["parse"] = max(0.0, self.total - self.stages["read"] - self.stages["output"])
+    if isinstance(output, str) and os.path.isfile(output):
+      self.bytes_out = os.path.getsize(output)
+
+  def summary(self):
+    """Return the statistics as a dictionary, ready to be dumped as JSON."""
+    records = sum(self.types.values())
+    return {"seconds":self.total, "stages":dict(self.stages), "days":self.days, "records":records,
+            "types":dict(self.types.most_common()), "lines_read":self.lines_read,
+            "unparsed":None if self.lines_read is None else self.lines_read - records,
+            "bytes_in":self.bytes_in, "bytes_out":self.bytes_out,
+            "lines_per_sec":records / self.total if self.total else None}
+
+  def text(self):
+    """Return the statistics as a human readable report."""
+    summary = self.summary()
+    report = ["Converted {records} records over {days} days in {seconds:.2f}s"
+              " ({lines_per_sec:.0f} lines/sec).".format(**summary), "", "Stages:"]
+    for (stage, seconds) in self.stages.items():
+      report.append("  {:<10}{:>10.3f}s".format(stage, seconds))
+    report += ["", "Records by type:"]
+    for (line_type, count) in summary["types"].items():
+      report.append("  {:<14}{:>12}".format(line_type, count))
+    report.append("")
+    for name in ("lines_read", "unparsed", "bytes_in", "bytes_out"):
+      if summary[name] is not None:
+        report.append("{:<16}{:>12}".format(name.replace("_", " ").capitalize() + ":", summary[name]))
+    return "\n".join(report)
+
+  def dumps(self, format="text"):
+    """Return the report as text or as JSON."""
+    return json.dumps(self.summary()) if format == "json" else self.text()
+
+
+class InstrumentedOutputHandler():
+  """Wraps an output handler to fill in a ConversionStats as days pass through it.
+
+  Only used when statistics are asked for, so a normal run pays nothing."""
+
+  def __init__(self, output_handler, stats):
+    self.output_handler = output_handler
+    self.stats = stats
+
+  def begin(self):
+    start = time.perf_counter()
+    self.output_handler.begin()
+    self.stats.stages["output"] += time.perf_counter() - start
+
+  def write_day(self, day):
+    stats = self.stats
+    (waiting, start) = (stats.waiting, time.perf_counter())
+    stats.days += len(day)
+    self.output_handler.write_day(dict((date, stats.count(lines)) for (date, lines) in day.items()))
+    stats.stages["output"] += time.perf_counter() - start - (stats.waiting - waiting)
+
+  def flush(self):
+    start = time.perf_counter()
+    self.output_handler.flush()
+    self.stats.stages["output"] += time.perf_counter() - start
+
+  def close(self):
+    start = time.perf_counter()
+    self.output_handler.close()
+    self.stats.stages["output"] += time.perf_counter() - start
@@ -0,0 +1,65 @@
+
+from sys import intern
+
+class SymbolTable():
+  """Gives each distinct value of one kind, such as nicknames or hosts, a stable
+  integer id.
+
+  Values are normalised (lowercased by default) before they are numbered, so
+  'Nick' and 'nick' share an id, but every raw spelling is remembered as well so
+  each one is only normalised and looked up once however often it repeats. Ids
+  handed out since the last call to take_new are kept so that they can be
+  written out in bulk, e.g. to the nicks table of a SQLite database."""
+
+  def __init__(self, normalise=str.lower, first_id=1):
+    self.normalise = normalise
+    self.raw_ids = {}
+    self.ids = {}
+    self.next_id = first_id
+    self.new = []
+
+  def load(self, rows):
+    """Seed the table with existing (id, normalised value) rows, for example
+    those already in a database being appended to."""
+    for (id_, value) in rows:
+      self.ids[value] = id_
+      self.next_id = max(self.next_id, id_ + 1)
+
+  def id(self, value):
+    """Return the id of value, numbering it if it has not been seen before."""
+    id_ = self.raw_ids.get(value)
+    if id_ is None:
+      normalised = intern(self.normalise(value))
+      id_ = self.ids.get(normalised)
+      if id_ is None:
+        id_ = self.ids[normalised] = self.next_id
+        self.next_id += 1
+        self.new.append((id_, normalised))
+      self.raw_ids[intern(value)] = id_
+    return id_
+
+  def take_new(self):
+    """Return the (id, normalised value) pairs numbered since the last call."""
+    (new, self.new) = (self.new, [])
+    return new
+
+  def __len__(self):
+    return len(self.ids)
+
+
+def normalise_nick(nick):
+  """Lowercase a nickname, which may be given as part of a full hostmask."""
+  return nick.split("!", 1)[0].lower()
+
+
+def split_userhost(userhost):
+  """Split a [~]user@host string into its (user, host) parts, dropping the '~'
+  some servers prefix unidentified users with."""
+  (user, _, host) = userhost.rpartition("@")
+  return (user.lstrip("~"), host)
+
+
+def split_hostmask(hostmask):
+  """Split a nick!user@host hostmask into its (nick, user, host) parts."""
+  (nick, _, userhost) = hostmask.partition("!")
+  return (nick,) + split_userhost(userhost)
@@ -1,25 +1,37 @@
-import string
 
-import time
+# Every valid time string seen so far mapped to its value in seconds. There are
+# only 86,400 distinct HH:MM:SS values in a day so this stays small.
+time_memo = {}
 
-def time2seconds(time_string):
-  """Convert a time string of the format HH:MM:SS or HH:MM to a timestamp in seconds."""
-  if len(time_string) != 8 and len(time_string) != 5: # Check if length is consistent with HH:MM:SS or HH:MM respectively.
-    raise ValueError("Time given to time2seconds() was not a time_string.")
-  for character in time_string:
-    if character in string.ascii_letters:
-      raise ValueError("Time given to time2seconds() was not a time_string.")
+def time2seconds(time_string, memo=time_memo):
+  """Convert a time string of the format HH:MM:SS or HH:MM to a timestamp in seconds.
+
+  Results are remembered in memo, pass memo=None to parse without it."""
+  if memo is not None:
+    try:
+      return memo[time_string]
+    except KeyError:
+      seconds = parse_time(time_string)
+      memo[time_string] = seconds
+      return seconds
+  return parse_time(time_string)
+
+def parse_time(time_string):
+  """Convert a time string of the format HH:MM:SS or HH:MM to a timestamp in seconds,
+  reading the fields from their fixed offsets rather than through time.strptime."""
   if len(time_string) == 8:
-    time_elements = time.strptime(time_string,"%H:%M:%S")
-    hours2minutes = time_elements.tm_hour * 60
-    minutes2seconds = hours2minutes + time_elements.tm_min
-    seconds = (minutes2seconds * 60) + time_elements.tm_sec
-    return seconds
+    (hours, minutes, seconds) = (time_string[0:2], time_string[3:5], time_string[6:8])
+    separated = time_string[2] == ":" and time_string[5] == ":"
   elif len(time_string) == 5:
-    time_elements = time.strptime(time_string, "%H:%M")
-    hours2minutes = time.elements.tm_hour * 60
-    minutes2seconds = hours2minutes + time_elements.tm_min
-    seconds = minutes2seconds * 60
-    return seconds
-  else:
-    raise ValueError("'time_string' was proper length and contained no alphanumeric characters, but was somehow not the proper length when it is checked again to determine which routine should be used to process the string.")
+    (hours, minutes, seconds) = (time_string[0:2], time_string[3:5], "00")
+    separated = time_string[2] == ":"
+  else: # Length is not consistent with HH:MM:SS or HH:MM.
+    raise ValueError("Time given to time2seconds() was not a time_string.")
+  if not (separated and time_string.isascii() and hours.isdigit() and
+          minutes.isdigit() and seconds.isdigit()):
+    raise ValueError("Time given to time2seconds() was not a time_string.")
+  (hours, minutes, seconds) = (int(hours), int(minutes), int(seconds))
+  # Same ranges as time.strptime, which allows leap seconds up to 61.
+  if hours > 23 or minutes > 59 or seconds > 61:
+    raise ValueError("Time given to time2seconds() was not a time_string.")
+  return (hours * 60 + minutes) * 60 + seconds